@@ -3,7 +3,10 @@ from django.contrib import admin
 from .models import (
     CustomUserModel,
     Example,
+    GenerationJob,
+    GenerationStat,
     Language,
+    PooledText,
     Text,
     Translation,
     UserTranslation,
@@ -17,3 +20,6 @@ admin.site.register(Translation)
 admin.site.register(UserTranslation)
 admin.site.register(Example)
 admin.site.register(Language)
+admin.site.register(GenerationJob)
+admin.site.register(PooledText)
+admin.site.register(GenerationStat)
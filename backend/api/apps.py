@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Invalidation of the translation cache.
+        from api import signals  # noqa: F401
+        # Checks of the settings.
+        from api import checks  # noqa: F401
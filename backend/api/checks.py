@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from api.utils.nlp import PIPELINE_PROFILES
+
+
+@register()
+def check_pipeline_profiles(app_configs, **kwargs):
+    """
+    Report the pipeline profiles of SPACY_DEFAULT_PIPELINE_PROFILE and
+    SPACY_PIPELINE_PROFILES that are not in PIPELINE_PROFILES, which would
+    otherwise only fail when a model is first loaded.
+    """
+    profiles = {
+        "SPACY_DEFAULT_PIPELINE_PROFILE": settings.SPACY_DEFAULT_PIPELINE_PROFILE,
+        **{
+            f"SPACY_PIPELINE_PROFILES[{language_code!r}]": profile
+            for language_code, profile in settings.SPACY_PIPELINE_PROFILES.items()
+        },
+    }
+
+    return [
+        Error(
+            f"Unknown pipeline profile {profile!r} in {setting}.",
+            hint=f"Use one of {', '.join(sorted(PIPELINE_PROFILES))}.",
+            id="api.E001",
+        )
+        for setting, profile in profiles.items()
+        if profile not in PIPELINE_PROFILES
+    ]
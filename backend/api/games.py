@@ -1,65 +1,51 @@
-import os
+import time
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.http import JsonResponse
-from openai import OpenAI
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.parsers import JSONParser
-from rest_framework.permissions import AllowAny
 
 from api.models import CustomUserModel, Language, Translation
 from api.serializers import CreateSentenceGameSerializer
+from api.utils.asynchronous import async_api_view, parse_json
+from api.utils.generation_plan import plan_grading, record_generation
+from api.utils.openai_client import get_async_openai_client
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])  # TODO: Security
-def create_sentence(request):
-    data = JSONParser().parse(request)
-    serializer = CreateSentenceGameSerializer(data=data)
+@async_api_view(['POST'])
+async def create_sentence(request):
+    serializer = CreateSentenceGameSerializer(data=parse_json(request))
 
-    if serializer.is_valid():
+    if await sync_to_async(serializer.is_valid)():
 
         user: CustomUserModel = request.user
         user.credit -= settings.TRANSLATION_API_CALL_COST
-        user.save()
+        await user.asave()
 
         if isinstance(serializer.validated_data, dict):
-            language: Language = (
-                serializer
-                .validated_data
-                .get("language", None)
-            )
-            sentence: str = serializer.validated_data.get("sentence", None)
-            translation: Translation = (
-                serializer
-                .validated_data
-                .get("translation", None)
-            )
-
-            word_source_language = ""
-            if translation.word_source.language:
-                word_source_language = f"in {translation.word_source.language.name}"
+            prompt = await sync_to_async(get_prompt)(serializer.validated_data)
 
-            prompt = f"""Answer to me in {language.name}. 
-If the following sentence [[{sentence}]] is correct{word_source_language} 
-and is a right use of the word [[{translation.word_source.word} / 
-{translation.word_target.word}]], tell me briefly that I am correct, otherwise 
-explain why not."""
-
-            client = OpenAI(
-                organization=os.environ.get("OPENAI_ORGANIZATION"),
-                api_key=os.environ.get("OPENAI_API_KEY")
-            )
+            client = get_async_openai_client()
+            plan = plan_grading()
+            start = time.monotonic()
 
-            result = client.chat.completions.create(
+            result = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": prompt}
                 ],
-                max_tokens=2048,
+                max_tokens=plan.max_tokens,
+                timeout=plan.timeout,
             )
             try:
                 answer = result.choices[0].message.content
+
+                await sync_to_async(record_generation)(
+                    plan,
+                    answer or "",
+                    result.choices[0].finish_reason,
+                    time.monotonic() - start,
+                    result.usage.completion_tokens if result.usage else None
+                )
             except:
                 # TODO
                 pass
@@ -67,3 +53,19 @@ explain why not."""
             return JsonResponse({"answer": answer})
 
     return JsonResponse(serializer.errors, status=400)
+
+
+def get_prompt(validated_data) -> str:
+    language: Language = validated_data.get("language", None)
+    sentence: str = validated_data.get("sentence", None)
+    translation: Translation = validated_data.get("translation", None)
+
+    word_source_language = ""
+    if translation.word_source.language:
+        word_source_language = f"in {translation.word_source.language.name}"
+
+    return f"""Answer to me in {language.name}. 
+If the following sentence [[{sentence}]] is correct{word_source_language} 
+and is a right use of the word [[{translation.word_source.word} / 
+{translation.word_target.word}]], tell me briefly that I am correct, otherwise 
+explain why not."""
@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Text
+from api.utils.nlp import (
+    PIPELINE_PROFILES,
+    ModelRegistry,
+    get_model_from_language,
+    split_doc
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the speed of the spaCy pipeline profiles on stored texts, "
+        "and check that they produce the same tokens and lemmas as the full "
+        "pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "languages",
+            nargs="+",
+            help="Language codes to benchmark.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=200,
+            help="Maximum number of texts used per language.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=64,
+        )
+
+    def handle(self, *args, **options):
+        for language_code in options["languages"]:
+            model = get_model_from_language(language_code)
+            if not model:
+                raise CommandError(f"No spaCy model for {language_code}.")
+
+            texts = list(
+                Text
+                .objects
+                .filter(
+                    language__code=language_code,
+                    has_finished_generation=True,
+                    text__isnull=False
+                )
+                .values_list("text", flat=True)
+                [:options["limit"]]
+            )
+            if not texts:
+                self.stdout.write(f"{language_code}: no texts to benchmark.")
+                continue
+
+            self.benchmark(language_code, model, texts, options["batch_size"])
+
+    def benchmark(self, language_code, model, texts, batch_size):
+        words = sum(len(text.split()) for text in texts)
+        reference = None
+        reference_duration = None
+
+        # Load the models the way the application does, without touching
+        # the models of the process-wide registry.
+        registry = ModelRegistry()
+
+        for profile in PIPELINE_PROFILES:
+            nlp = registry.get(model, profile)
+
+            start = time.perf_counter()
+            # Sentence boundaries are left out: the parser and the
+            # sentencizer do not split sentences the same way.
+            results = [
+                (tokens["offsets"], tokens["lemmas"], tokens["lemma_ids"])
+                for tokens in (
+                    split_doc(doc)
+                    for doc in nlp.pipe(texts, batch_size=batch_size)
+                )
+            ]
+            duration = time.perf_counter() - start
+
+            if reference is None:
+                reference, reference_duration = results, duration
+
+            different = sum(
+                result != expected
+                for result, expected in zip(results, reference)
+            )
+            self.stdout.write(
+                f"{language_code} {profile:>6}: {len(texts)} texts, "
+                f"{words / duration:,.0f} words/s, "
+                f"x{reference_duration / duration:.2f}, "
+                f"{different} texts differ from 'full' "
+                f"[{', '.join(nlp.pipe_names)}]"
+            )
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.utils.text_pool import fill_text_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate texts about a random subject in advance, until each pool "
+        "holds TEXT_POOL_SIZE texts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep refilling the pools as texts are served.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds between two refills with --loop. Defaults to the "
+                 "time between two generations at TEXT_POOL_REFILL_RATE, or "
+                 "60 if it is 0.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.TEXT_POOL_SIZE:
+            self.stdout.write("The text pool is disabled (TEXT_POOL_SIZE=0).")
+            return
+
+        interval = options["interval"] or (
+            60 / settings.TEXT_POOL_REFILL_RATE
+            if settings.TEXT_POOL_REFILL_RATE > 0 else 60)
+
+        while True:
+            close_old_connections()
+            generated = fill_text_pool()
+            if generated:
+                self.stdout.write(f"Generated {generated} pooled texts.")
+
+            if not options["loop"]:
+                break
+            time.sleep(interval)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.utils.generation_plan import get_generation_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the number of words asked to OpenAI with the number of "
+        "words of the completions, to tune GENERATION_TOKENS_PER_WORD."
+    )
+
+    def handle(self, *args, **options):
+        stats = get_generation_stats()
+        if not stats:
+            self.stdout.write("No generation recorded yet.")
+            return
+
+        for row in stats:
+            self.stdout.write(
+                f"{row['kind']:<8} {row['level'] or '-':<13} "
+                f"{row['requested_words'] or '-':>4} words asked: "
+                f"{row['average_words']:.0f} words on average, "
+                f"{row['truncated']}/{row['count']} truncated, "
+                f"{row['average_duration']:.1f}s"
+            )
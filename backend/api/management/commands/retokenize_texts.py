@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.models import Text
+from api.utils.tokenization import tokenize_texts
+
+
+class Command(BaseCommand):
+    help = (
+        "Tokenize texts again with spaCy, in batches, and save their tokens. "
+        "Useful after installing a model or changing pipelines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--language",
+            nargs="*",
+            default=[],
+            help="Only retokenize texts in these language codes.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.TOKENIZATION_BATCH_SIZE,
+            help="Number of texts spaCy processes at once.",
+        )
+        parser.add_argument(
+            "--n-process",
+            type=int,
+            default=settings.TOKENIZATION_N_PROCESS,
+            help="Number of processes spaCy uses.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of texts loaded from and saved to the database at once.",
+        )
+
+    def handle(self, *args, **options):
+        texts = (
+            Text
+            .objects
+            .filter(has_finished_generation=True, text__isnull=False)
+            .select_related("language")
+            .order_by("pk")
+        )
+        if options["language"]:
+            texts = texts.filter(language__code__in=options["language"])
+
+        start = time.perf_counter()
+        count = 0
+        chunk = []
+
+        for text in texts.iterator(chunk_size=options["chunk_size"]):
+            chunk.append(text)
+            if len(chunk) >= options["chunk_size"]:
+                count += self.retokenize(chunk, options)
+                chunk = []
+
+        if chunk:
+            count += self.retokenize(chunk, options)
+
+        duration = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Retokenized {count} texts in {duration:.1f}s "
+            f"({count / duration if duration else 0:.1f} texts/s)."
+        ))
+
+    def retokenize(self, texts, options):
+        results = tokenize_texts(
+            [
+                (
+                    text.text,
+                    text.language.code if text.language else None
+                )
+                for text in texts
+            ],
+            batch_size=options["batch_size"],
+            n_process=options["n_process"],
+            refresh=True,
+        )
+
+        for text, (normalized_text, tokens) in zip(texts, results):
+            text.text = normalized_text
+            text.tokens = tokens
+
+        Text.objects.bulk_update(texts, ["text", "tokens"])
+        return len(texts)
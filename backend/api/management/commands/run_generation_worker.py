@@ -0,0 +1,60 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.utils.generation import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the text generation jobs stored in the database (generation "
+        "backend \"queue\"). Start several workers to generate more texts "
+        "at the same time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1,
+            help="Seconds to wait when there is no job to run.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once there is no job left to run.",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        previous_handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        try:
+            self.run(options)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def run(self, options):
+        while not self.stopping:
+            close_old_connections()
+            job = claim_job()
+
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            self.stdout.write(f"Running job {job.pk} ({job.task}).")
+            run_job(job)
+            self.stdout.write(f"Job {job.pk}: {job.status}.")
+
+    def stop(self, signum, frame):
+        # Let the current job finish.
+        self.stopping = True
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:12
+
+import re
+
+from django.db import migrations, models
+
+# Texts used to be stored as their words and lemmas joined with this
+# separator, in Text.text and Text.lemmas.
+WORD_SEPARATOR = "_$_"
+
+
+def build_tokens(words, lemmas):
+    offsets = []
+    lemma_ids = {}
+    ids = []
+    sentences = [0] if words else []
+    offset = 0
+
+    for idx, (word, lemma) in enumerate(zip(words, lemmas)):
+        offsets.append(offset)
+        ids.append(lemma_ids.setdefault(lemma, len(lemma_ids)))
+        offset += len(word)
+        if re.search(r'[.!?\n]', word) and idx + 1 < len(words):
+            sentences.append(idx + 1)
+
+    return {
+        "offsets": offsets,
+        "lemmas": list(lemma_ids),
+        "lemma_ids": ids,
+        "sentences": sentences,
+    }
+
+
+def split_texts(apps, schema_editor):
+    Text = apps.get_model("api", "Text")
+    texts = []
+
+    for text in Text.objects.filter(has_finished_generation=True).iterator():
+        if not text.text:
+            continue
+
+        words = text.text.split(WORD_SEPARATOR)
+        lemmas = (text.lemmas or "").split(WORD_SEPARATOR)
+        if len(lemmas) != len(words):
+            lemmas = words
+
+        pairs = [(word, lemma) for word, lemma in zip(words, lemmas) if word]
+
+        text.text = "".join(word for word, _ in pairs)
+        text.tokens = build_tokens(
+            [word for word, _ in pairs],
+            [lemma for _, lemma in pairs]
+        )
+        texts.append(text)
+
+    Text.objects.bulk_update(texts, ["text", "tokens"], batch_size=500)
+
+
+def join_texts(apps, schema_editor):
+    Text = apps.get_model("api", "Text")
+    texts = []
+
+    for text in Text.objects.filter(tokens__isnull=False).iterator():
+        offsets = text.tokens["offsets"]
+        ends = offsets[1:] + [len(text.text)]
+        words = [text.text[start:end] for start, end in zip(offsets, ends)]
+        lemmas = [text.tokens["lemmas"][idx]
+                  for idx in text.tokens["lemma_ids"]]
+
+        text.text = WORD_SEPARATOR.join(words)
+        text.lemmas = WORD_SEPARATOR.join(lemmas)
+        texts.append(text)
+
+    Text.objects.bulk_update(texts, ["text", "lemmas"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_rename_userid_customusermodel_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='tokens',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(split_texts, join_texts),
+        migrations.RemoveField(
+            model_name='text',
+            name='lemmas',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(max_length=20)),
+                ('length', models.CharField(max_length=10)),
+                ('text', models.TextField(max_length=10000)),
+                ('tokens', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('language', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.language')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['language', 'level', 'length', 'created_at'], name='api_pooledt_languag_2836fe_idx')],
+            },
+        ),
+    ]
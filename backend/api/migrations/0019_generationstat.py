@@ -0,0 +1,32 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_pooledtext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('text', 'Text'), ('pooled', 'Pooled text'), ('grading', 'Grading')], max_length=20)),
+                ('language_code', models.CharField(blank=True, max_length=10)),
+                ('level', models.CharField(blank=True, max_length=20)),
+                ('requested_words', models.IntegerField(blank=True, null=True)),
+                ('words', models.IntegerField()),
+                ('max_tokens', models.IntegerField()),
+                ('completion_tokens', models.IntegerField(blank=True, null=True)),
+                ('finish_reason', models.CharField(blank=True, max_length=20)),
+                ('duration', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'level', 'requested_words'], name='api_generat_kind_063e8b_idx')],
+            },
+        ),
+    ]
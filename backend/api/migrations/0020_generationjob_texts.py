@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_generationstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='texts',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -7,6 +7,7 @@ from django.contrib.auth.models import (
     PermissionsMixin
 )
 from django.db import models
+from django.utils import timezone
 
 TRANSLATION_PROVIDERS = (
     ("microsoft", "Microsoft"),
@@ -14,6 +15,19 @@ TRANSLATION_PROVIDERS = (
     ("chatgpt", "ChatGPT"),
 )
 
+GENERATION_KINDS = (
+    ("text", "Text"),
+    ("pooled", "Pooled text"),
+    ("grading", "Grading"),
+)
+
+GENERATION_JOB_STATUSES = (
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+)
+
 
 class Language(models.Model):
     name = models.TextField(max_length=100, null=False, blank=False)
@@ -85,7 +99,9 @@ class CustomUserModel(AbstractBaseUser, PermissionsMixin):
 class Text(models.Model):
     subject = models.TextField(max_length=200, null=True, blank=True)
     text = models.TextField(max_length=10000, null=True, blank=True)
-    lemmas = models.TextField(max_length=10000, null=True, blank=True)
+    # Offsets of the tokens in `text`, lemma ids and sentence boundaries,
+    # see api.utils.nlp.build_tokens.
+    tokens = models.JSONField(null=True, blank=True)
     has_finished_generation = models.BooleanField(default=False)
     language = models.ForeignKey(
         Language, on_delete=models.SET_NULL, null=True)
@@ -93,6 +109,65 @@ class Text(models.Model):
         CustomUserModel, on_delete=models.CASCADE, null=True)
 
 
+class PooledText(models.Model):
+    """
+    Text generated in advance about a random subject, for users asking for
+    one (see api.utils.text_pool).
+    """
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+    level = models.CharField(max_length=20)
+    length = models.CharField(max_length=10)
+    text = models.TextField(max_length=10000)
+    tokens = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["language", "level", "length", "created_at"]),
+        ]
+
+
+class GenerationJob(models.Model):
+    text = models.ForeignKey(Text, on_delete=models.CASCADE)
+    # Dotted path of the function run as task(text, *arguments).
+    task = models.CharField(max_length=200)
+    arguments = models.JSONField(default=list, blank=True)
+    # Number of texts the job generates, counted toward
+    # GENERATION_MAX_JOBS_PER_USER.
+    texts = models.IntegerField(default=1)
+    status = models.CharField(
+        max_length=20, choices=GENERATION_JOB_STATUSES, default='pending')
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(default="", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+
+class GenerationStat(models.Model):
+    """
+    Requested and actual size of a completion asked to OpenAI, to tune the
+    limits of api.utils.generation_plan.
+    """
+    kind = models.CharField(max_length=20, choices=GENERATION_KINDS)
+    language_code = models.CharField(max_length=10, blank=True)
+    level = models.CharField(max_length=20, blank=True)
+    requested_words = models.IntegerField(null=True, blank=True)
+    words = models.IntegerField()
+    max_tokens = models.IntegerField()
+    completion_tokens = models.IntegerField(null=True, blank=True)
+    finish_reason = models.CharField(max_length=20, blank=True)
+    duration = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["kind", "level", "requested_words"])]
+
+
 class Word(models.Model):
     language = models.ForeignKey(
         Language, on_delete=models.SET_NULL, null=True)
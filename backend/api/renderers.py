@@ -0,0 +1,30 @@
+import json
+
+from djangorestframework_camel_case.settings import api_settings
+from djangorestframework_camel_case.util import camelize
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def format_event(event: str, data) -> str:
+    """
+    Format a Server-Sent Event whose data is `data` encoded in JSON, with
+    camelCase keys like the rest of the API.
+    """
+    data = camelize(data, **api_settings.JSON_UNDERSCOREIZE)
+    return f"event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Accept requests for text/event-stream. Streams are returned as
+    StreamingHttpResponse, so this only renders errors, as an "error" event.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return format_event("error", data).encode(self.charset)
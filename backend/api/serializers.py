@@ -1,8 +1,11 @@
+from django.conf import settings
 from rest_framework.serializers import (
     BooleanField,
     CharField,
     ChoiceField,
     EmailField,
+    IntegerField,
+    ListField,
     ModelSerializer,
     PrimaryKeyRelatedField,
     Serializer
@@ -60,6 +63,10 @@ class TextSerializer(ModelSerializer):
     class Meta:
         model = Text
         fields = '__all__'
+        read_only_fields = ["tokens"]
+        extra_kwargs = {
+            "text": {"max_length": settings.TEXT_MAX_LENGTH},
+        }
 
     def to_representation(self, obj):
         ret = super().to_representation(obj)
@@ -71,6 +78,33 @@ class TextSerializer(ModelSerializer):
         return ret
 
 
+class TextBatchSerializer(Serializer):
+    """
+    Several texts to generate at once: one per subject of `subjects`, or
+    `count` texts about `subject`.
+    """
+    subjects = ListField(
+        child=CharField(allow_blank=True, max_length=200),
+        required=False,
+        min_length=1,
+        max_length=settings.GENERATION_BATCH_MAX_SIZE
+    )
+    subject = CharField(required=False, allow_blank=True, max_length=200)
+    count = IntegerField(required=False, default=1, min_value=1,
+                         max_value=settings.GENERATION_BATCH_MAX_SIZE)
+    language = PrimaryKeyRelatedField(
+        queryset=Language.objects.all(), required=False, allow_null=True)
+    level = ChoiceField(required=False, allow_blank=False, default="intermediate", choices=[
+                        "beginner", "intermediate", "advanced", "mastery"])
+    length = ChoiceField(required=False, allow_blank=False, default='50',
+                         choices=['50', '200', '400'])
+
+    def validate(self, attrs):
+        if "subjects" not in attrs:
+            attrs["subjects"] = [attrs.get("subject", "")] * attrs["count"]
+        return attrs
+
+
 class WordSerializer(ModelSerializer):
     class Meta:
         model = Word
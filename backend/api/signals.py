@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Example, Translation
+from api.utils.translation_cache import invalidate_translation
+
+
+@receiver([post_save, post_delete], sender=Translation)
+def invalidate_translation_cache(sender, instance: Translation, **kwargs):
+    invalidate_translation(instance)
+
+
+@receiver([post_save, post_delete], sender=Example)
+def invalidate_example_translation_cache(sender, instance: Example, **kwargs):
+    try:
+        translation = instance.translation
+    except Translation.DoesNotExist:
+        return
+    invalidate_translation(translation)
@@ -1,11 +1,90 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
 
-from api.models import Language, Word
+import spacy
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.checks import check_pipeline_profiles
+from api.models import (
+    CustomUserModel,
+    Example,
+    GenerationJob,
+    GenerationStat,
+    Language,
+    PooledText,
+    Text,
+    Translation,
+    Word
+)
+from api.utils.generation import (
+    GenerationBusy,
+    GenerationExecutor,
+    enqueue_job
+)
+from api.utils.nlp import (
+    ModelRegistry,
+    get_pipeline_profile,
+    get_words,
+    model_registry
+)
+from api.utils import (
+    ask_gpt_to_generate_a_text,
+    ask_gpt_to_generate_texts,
+    complete_prompt,
+    generate_text,
+    openai_client,
+    provider_client,
+    text_pool,
+    tokenize_text_object_in_chunks
+)
+from api.utils.generation_cache import get_generation_cache
+from api.utils.generation_plan import (
+    finish_completion,
+    plan_generation,
+    plan_grading
+)
+from api.utils.micro_batch import MicroBatcher
+from api.utils.single_flight import SingleFlight
+from api.utils.streaming import (
+    GenerationStream,
+    close_generation_stream,
+    notify_text_finished,
+    open_generation_stream
+)
+from api.utils.tokenization import (
+    get_cache_key,
+    get_tokenization_cache,
+    split_into_chunks,
+    tokenize_text,
+    tokenize_text_in_chunks,
+    tokenize_texts
+)
 from api.utils.translation import (
     get_dictionnary_examples,
     get_dictionnary_lookup,
-    save_translate_result
+    save_translate_result,
+    send_dictionnary_request
 )
+from api.utils.translation_cache import (
+    LRUCache,
+    clear_translation_cache,
+    get_translation_cache,
+    get_translation_cache_key
+)
+from api.utils.vision_client import get_async_vision_client
+from api.views import alookup_translations, lookup_translations
 
 TRANSLATION_RESULT = [
     {
@@ -404,3 +483,1771 @@ class TranslationTestCase(TestCase):
             translations[0].word_target.language,
             self.language_to
         )
+
+
+class ModelRegistryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.loaded = []
+
+        def loader(name, exclude):
+            time.sleep(0.05)
+            self.loaded.append(name)
+            return object()
+
+        self.registry = ModelRegistry(loader=loader)
+
+    def test_model_is_loaded_once(self):
+        first = self.registry.get("en_core_web_lg")
+        second = self.registry.get("en_core_web_lg")
+
+        self.assertIs(first, second)
+        self.assertEquals(self.loaded, ["en_core_web_lg"])
+
+    def test_concurrent_first_requests_share_a_single_load(self):
+        threads = [
+            threading.Thread(target=self.registry.get, args=["fr_core_news_lg"])
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(self.loaded, ["fr_core_news_lg"])
+        self.assertEquals(self.registry.stats()[0]["name"], "fr_core_news_lg")
+
+    def test_least_recently_used_model_is_evicted(self):
+        self.registry.max_models = 2
+        self.registry.get("en_core_web_lg")
+        self.registry.get("fr_core_news_lg")
+        self.registry.get("en_core_web_lg")
+        self.registry.get("de_core_news_lg")
+
+        self.assertTrue(self.registry.is_loaded("en_core_web_lg"))
+        self.assertFalse(self.registry.is_loaded("fr_core_news_lg"))
+        self.assertTrue(self.registry.is_loaded("de_core_news_lg"))
+
+    def test_pinned_model_is_never_evicted(self):
+        self.registry.max_models = 1
+        self.registry.pinned = {"en_core_web_lg"}
+        self.registry.get("en_core_web_lg")
+        self.registry.get("fr_core_news_lg")
+        self.registry.get("de_core_news_lg")
+
+        self.assertTrue(self.registry.is_loaded("en_core_web_lg"))
+        self.assertFalse(self.registry.is_loaded("fr_core_news_lg"))
+        self.assertTrue(self.registry.is_loaded("de_core_news_lg"))
+
+    def test_profiles_are_loaded_separately(self):
+        self.registry.get("en_core_web_lg", "lemma")
+        self.registry.get("en_core_web_lg", "full")
+
+        self.assertTrue(self.registry.is_loaded("en_core_web_lg", "lemma"))
+        self.assertTrue(self.registry.is_loaded("en_core_web_lg", "full"))
+
+    @override_settings(
+        SPACY_DEFAULT_PIPELINE_PROFILE="lemma",
+        SPACY_PIPELINE_PROFILES={"ja": "full"}
+    )
+    def test_pipeline_profile_per_language(self):
+        self.assertEquals(get_pipeline_profile("en"), "lemma")
+        self.assertEquals(get_pipeline_profile("ja"), "full")
+
+    @override_settings(
+        SPACY_DEFAULT_PIPELINE_PROFILE="lemma",
+        SPACY_PIPELINE_PROFILES={"ja": "full", "zh": "fulll"}
+    )
+    def test_unknown_pipeline_profiles_are_reported(self):
+        errors = check_pipeline_profiles(None)
+
+        self.assertEquals(len(errors), 1)
+        self.assertEquals(errors[0].id, "api.E001")
+        self.assertIn("'fulll'", errors[0].msg)
+
+
+class ReadinessTestCase(SimpleTestCase):
+
+    @override_settings(SPACY_WARMUP_LANGUAGES=[])
+    def test_ready_without_warm_up(self):
+        response = self.client.get("/back/api/ready/")
+
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.json()["ready"])
+
+
+@override_settings(TOKENIZATION_WORKERS=0)
+class TokenizationTestCase(SimpleTestCase):
+
+    def setUp(self):
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+    def test_tokenize_text(self):
+        text, tokens = tokenize_text("Hello, friend! How are you?", "en")
+
+        self.assertEquals(text, "Hello, friend! How are you?")
+        self.assertEquals(tokens["offsets"], [0, 5, 7, 13, 15, 19, 23, 26])
+        self.assertEquals(tokens["sentences"], [0, 4])
+        self.assertEquals(
+            get_words(text, tokens),
+            ["Hello", ", ", "friend", "! ", "How ", "are ", "you", "?"]
+        )
+
+    def test_offsets_count_code_points(self):
+        text, tokens = tokenize_text("I love 😀 pizza and cats.", "en")
+
+        self.assertEquals(
+            get_words(text, tokens),
+            ["I ", "love ", "😀 ", "pizza ", "and ", "cats", "."]
+        )
+        # What the frontend slices, one code point per character.
+        self.assertEquals(tokens["offsets"][3], list(text).index("p"))
+
+    def test_tokenize_text_without_model(self):
+        text, tokens = tokenize_text("Hello, friend! Hello.", "xx")
+
+        self.assertEquals(
+            get_words(text, tokens),
+            ["Hello", ", ", "friend", "! ", "Hello", "."]
+        )
+        self.assertEquals(
+            tokens["lemmas"],
+            ["Hello", ", ", "friend", "! ", "."]
+        )
+        self.assertEquals(tokens["lemma_ids"], [0, 1, 2, 3, 0, 4])
+        self.assertEquals(tokens["sentences"], [0, 4])
+
+    def test_tokenize_texts_keeps_order(self):
+        results = tokenize_texts([
+            ("Hello, friend!", "en"),
+            ("Bonjour, ami !", "xx"),
+            ("Good bye.", "en"),
+        ])
+
+        self.assertEquals(
+            [get_words(*result) for result in results],
+            [
+                ["Hello", ", ", "friend", "!"],
+                ["Bonjour", ", ", "ami", " !"],
+                ["Good ", "bye", "."],
+            ]
+        )
+
+    def test_tokenization_results_are_cached(self):
+        with patch("api.utils.tokenization._tokenize_text",
+                   return_value=("a", "b", False)) as tokenize:
+            tokenize_text("Hello,\r\nfriend!", "en")
+            result = tokenize_text("Hello,\nfriend!", "en")
+
+        self.assertEquals(result, ("a", "b"))
+        self.assertEquals(tokenize.call_count, 1)
+
+    def test_fallback_results_are_not_cached(self):
+        def fail(name, exclude):
+            raise OSError("Model not found")
+
+        with patch.object(model_registry, "_loader", fail), \
+                self.assertLogs("api.utils.nlp", level="ERROR"):
+            tokenize_text("Hello, friend!", "en")
+            tokenize_texts([("Good bye.", "en")])
+
+        self.assertIsNone(get_tokenization_cache().get(
+            get_cache_key("Hello, friend!", "en")))
+        self.assertIsNone(get_tokenization_cache().get(
+            get_cache_key("Good bye.", "en")))
+
+        tokenize_text("Hello, friend!", "en")
+
+        self.assertIsNotNone(get_tokenization_cache().get(
+            get_cache_key("Hello, friend!", "en")))
+
+    def test_split_into_chunks(self):
+        text = "First line.\nSecond line is longer. It has two sentences.\n"
+
+        chunks = split_into_chunks(text, 30)
+
+        self.assertEquals("".join(chunks), text)
+        self.assertEquals(chunks, [
+            "First line.\n",
+            "Second line is longer. ",
+            "It has two sentences.\n",
+        ])
+        self.assertEquals(split_into_chunks("abcdefgh", 3), ["abc", "def", "gh"])
+
+    @override_settings(TOKENIZATION_CHUNK_LENGTH=20)
+    def test_tokenize_text_in_chunks(self):
+        text = "Hello, friend! How are you? Fine, thanks."
+
+        results = list(tokenize_text_in_chunks(text, "en"))
+
+        self.assertEquals(len(results), 3)
+        self.assertEquals(results[-1][0], text)
+        self.assertEquals(results[-1][1], tokenize_text(text, "en")[1])
+
+
+class RetokenizeTextsTestCase(TestCase):
+
+    def test_command_retokenizes_texts(self):
+        language = Language.objects.create(name="Unknown", code="xx")
+        text = Text.objects.create(
+            text="Hello, friend!",
+            has_finished_generation=True,
+            language=language
+        )
+
+        call_command("retokenize_texts", stdout=open(os.devnull, "w"))
+
+        text.refresh_from_db()
+        self.assertEquals(text.text, "Hello, friend!")
+        self.assertEquals(text.tokens["offsets"], [0, 5, 7, 13])
+
+
+class GenerationExecutorTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def test_full_queue_rejects_jobs(self):
+        executor = GenerationExecutor(max_workers=1, queue_size=1)
+        executor.submit(self.release.wait)
+        executor.submit(self.release.wait)
+
+        with self.assertRaises(GenerationBusy):
+            executor.submit(self.release.wait)
+
+    def test_jobs_per_user_are_limited(self):
+        executor = GenerationExecutor(
+            max_workers=2, queue_size=2, max_jobs_per_user=1)
+        executor.submit(self.release.wait, user=1)
+
+        with self.assertRaises(GenerationBusy):
+            executor.submit(self.release.wait, user=1)
+
+        executor.submit(self.release.wait, user=2)
+
+    def test_finished_jobs_free_their_slot(self):
+        executor = GenerationExecutor(max_workers=1, queue_size=0)
+        executor.submit(time.sleep, 0).result()
+        executor.submit(time.sleep, 0).result()
+
+        self.assertEquals(executor.stats()["jobs"], 0)
+
+    def test_weighted_jobs_count_toward_the_limits(self):
+        executor = GenerationExecutor(
+            max_workers=2, queue_size=2, max_jobs_per_user=3)
+        executor.submit(self.release.wait, user=1, weight=3)
+
+        with self.assertRaises(GenerationBusy):
+            executor.submit(self.release.wait, user=1)
+        with self.assertRaises(GenerationBusy):
+            executor.submit(self.release.wait, user=2, weight=2)
+
+        executor.submit(self.release.wait, user=2)
+
+    def test_map_runs_within_the_workers_of_the_job(self):
+        executor = GenerationExecutor(max_workers=1, queue_size=0)
+
+        def square_all(numbers):
+            futures = executor.map(lambda n: n * n, numbers, concurrency=4)
+            return [future.result() for future in futures]
+
+        # The only worker runs the job, which does not wait for helpers.
+        result = executor.submit(square_all, [1, 2, 3], weight=1).result(5)
+
+        self.assertEquals(result, [1, 4, 9])
+
+    def test_failed_jobs_mark_their_text_as_failed(self):
+        executor = GenerationExecutor(max_workers=1, queue_size=0)
+        text = Text(pk=1)
+
+        with patch("api.utils.generation.mark_text_as_failed") as mark, \
+                self.assertLogs("api.utils.generation", level="ERROR"), \
+                self.assertRaises(Exception):
+            executor.submit(fail, text).result()
+
+        mark.assert_called_once_with(text)
+        self.assertEquals(executor.stats()["jobs"], 0)
+
+
+def generate_hello(text_object, greeting):
+    text_object.text = greeting
+    text_object.has_finished_generation = True
+    text_object.save()
+
+
+def fail(text_object):
+    raise Exception("OpenAI is down.")
+
+
+@override_settings(GENERATION_JOB_MAX_ATTEMPTS=2, GENERATION_JOB_BACKOFF=0)
+class GenerationJobTestCase(TestCase):
+
+    def setUp(self):
+        self.text = Text.objects.create(text="", has_finished_generation=False)
+
+    def run_worker(self):
+        call_command(
+            "run_generation_worker", "--once", stdout=open(os.devnull, "w"))
+
+    def test_worker_runs_jobs(self):
+        job = enqueue_job(self.text, "api.tests.generate_hello", ["Hello!"])
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.text.refresh_from_db()
+        self.assertEquals(job.status, "done")
+        self.assertEquals(self.text.text, "Hello!")
+
+    def test_failed_jobs_are_retried_then_marked_as_failed(self):
+        job = enqueue_job(self.text, "api.tests.fail", [])
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.text.refresh_from_db()
+        self.assertEquals(job.status, "failed")
+        self.assertEquals(job.attempts, 2)
+        self.assertIn("OpenAI is down.", job.last_error)
+        self.assertTrue(self.text.has_finished_generation)
+
+    def test_abandoned_jobs_are_claimed_again(self):
+        job = enqueue_job(self.text, "api.tests.generate_hello", ["Hello!"])
+        GenerationJob.objects.filter(pk=job.pk).update(
+            status="running",
+            locked_at=job.run_after - timedelta(hours=1)
+        )
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEquals(job.status, "done")
+
+
+class GenerationStreamTestCase(SimpleTestCase):
+
+    async def test_listen_to_chunks_published_by_another_thread(self):
+        stream = GenerationStream()
+        stream.publish("Once ")
+
+        def generate():
+            time.sleep(0.05)
+            stream.publish("upon ")
+            stream.publish("a time.")
+            stream.finish()
+
+        threading.Thread(target=generate).start()
+        chunks = [chunk async for chunk in stream.listen(timeout=5)]
+
+        self.assertEquals(chunks, ["Once ", "upon ", "a time."])
+
+    async def test_listen_yields_none_without_chunks(self):
+        stream = GenerationStream()
+        threading.Timer(0.15, stream.finish).start()
+
+        chunks = [chunk async for chunk in stream.listen(timeout=0.05)]
+
+        self.assertIn(None, chunks)
+
+
+@override_settings(GENERATION_STREAM_TIMEOUT=5)
+class TextStreamTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.text = Text.objects.create(
+            creator=self.user,
+            text="Once upon a time.",
+            has_finished_generation=True
+        )
+
+    async def get_events(self, text: Text):
+        response = await self.async_client.get(
+            f"/back/api/texts/{text.pk}/stream/",
+            headers={
+                "Accept": "text/event-stream",
+                "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+            }
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response["Content-Type"], "text/event-stream")
+        return b"".join([
+            chunk async for chunk in response.streaming_content
+        ]).decode()
+
+    async def test_stream_chunks_then_text(self):
+        stream = open_generation_stream(self.text.pk)
+        stream.publish("Once upon")
+        stream.publish(" a time.")
+        stream.finish()
+
+        try:
+            events = await self.get_events(self.text)
+        finally:
+            close_generation_stream(self.text.pk)
+
+        self.assertLess(
+            events.index('data: {"text": "Once upon"}'),
+            events.index('data: {"text": " a time."}')
+        )
+        self.assertIn('event: text\ndata: {"id": %d' % self.text.pk, events)
+        self.assertIn('"hasFinishedGeneration": true', events)
+
+    async def test_stream_generated_text(self):
+        events = await self.get_events(self.text)
+
+        self.assertNotIn("event: chunk", events)
+        self.assertIn('"text": "Once upon a time."', events)
+
+    @override_settings(TOKENIZATION_CHUNK_LENGTH=20, TOKENIZATION_WORKERS=0)
+    def test_pasted_text_chunks_are_published(self):
+        text = "Hello, friend! How are you? Fine, thanks."
+        pasted_text = Text.objects.create(
+            creator=self.user, text="", has_finished_generation=False)
+        stream = MagicMock()
+
+        with patch("api.utils.open_generation_stream", return_value=stream):
+            tokenize_text_object_in_chunks(pasted_text, text)
+
+        chunks = [call.args[0] for call in stream.publish.call_args_list]
+        self.assertEquals(len(chunks), 3)
+        self.assertEquals("".join(chunks), text)
+        pasted_text.refresh_from_db()
+        self.assertTrue(pasted_text.has_finished_generation)
+
+
+@override_settings(GENERATION_STATUS_CHECK_INTERVAL=10)
+class GenerationStatusTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.finished_text = Text.objects.create(
+            creator=self.user, text="Hello!", has_finished_generation=True)
+        self.pending_text = Text.objects.create(
+            creator=self.user, text="", has_finished_generation=False)
+
+    async def get_finished(self, pending, timeout=5):
+        response = await self.async_client.get(
+            "/back/api/texts/status/",
+            {"pending": ",".join(str(text.pk) for text in pending),
+             "timeout": timeout},
+            headers={
+                "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+            }
+        )
+        self.assertEquals(response.status_code, 200)
+        content = b"".join([
+            chunk async for chunk in response.streaming_content
+        ])
+        return json.loads(content)["finished"]
+
+    async def test_finished_texts_are_returned_at_once(self):
+        start = time.monotonic()
+        finished = await self.get_finished(
+            [self.finished_text, self.pending_text])
+
+        self.assertEquals(finished, [self.finished_text.pk])
+        self.assertLess(time.monotonic() - start, 1)
+
+    async def test_wait_for_texts_to_finish(self):
+        async def finish():
+            await asyncio.sleep(0.1)
+            await (
+                Text
+                .objects
+                .filter(pk=self.pending_text.pk)
+                .aupdate(has_finished_generation=True)
+            )
+            notify_text_finished()
+
+        start = time.monotonic()
+        task = asyncio.create_task(finish())
+        finished = await self.get_finished([self.pending_text], timeout=5)
+        await task
+
+        self.assertEquals(finished, [self.pending_text.pk])
+        self.assertLess(time.monotonic() - start, 2)
+
+    async def test_timeout(self):
+        finished = await self.get_finished([self.pending_text], timeout=0.1)
+
+        self.assertEquals(finished, [])
+
+    async def test_negative_timeout_answers_at_once(self):
+        start = time.monotonic()
+        finished = await self.get_finished([self.pending_text], timeout=-5)
+
+        self.assertEquals(finished, [])
+        self.assertLess(time.monotonic() - start, 1)
+
+    async def test_invalid_timeout(self):
+        for timeout in ["nan", "inf", "soon"]:
+            response = await self.async_client.get(
+                "/back/api/texts/status/",
+                {"pending": self.pending_text.pk, "timeout": timeout},
+                headers={
+                    "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+                }
+            )
+            self.assertEquals(response.status_code, 400)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-3.5-turbo",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Hola"},
+            }],
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OpenAIClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+
+        environ = patch.dict(os.environ, {
+            "OPENAI_API_KEY": "sk-test",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.server.server_port}/v1",
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+
+        openai_client._client = None
+        openai_client._stats.update(requests=0, new_connections=0)
+
+    def tearDown(self):
+        openai_client.get_openai_client().close()
+        openai_client._client = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            result = openai_client.get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "system", "content": "Say hello."}],
+            )
+            self.assertEquals(result.choices[0].message.content, "Hola")
+
+        self.assertIs(
+            openai_client.get_openai_client(),
+            openai_client.get_openai_client()
+        )
+        self.assertEquals(openai_client.get_openai_connection_stats(), {
+            "requests": 3,
+            "new_connections": 1,
+            "reused_connections": 2,
+            "reuse_ratio": 2 / 3,
+        })
+
+    async def test_async_connections_are_reused(self):
+        client = openai_client.get_async_openai_client()
+        for _ in range(2):
+            result = await client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "system", "content": "Say hello."}],
+            )
+            self.assertEquals(result.choices[0].message.content, "Hola")
+        await client.close()
+
+        stats = openai_client.get_openai_connection_stats()
+        self.assertEquals(stats["requests"], 2)
+        self.assertEquals(stats["new_connections"], 1)
+
+
+class VisionClientTestCase(SimpleTestCase):
+
+    async def test_one_client_per_event_loop(self):
+        with patch("api.utils.vision_client.vision.ImageAnnotatorAsyncClient",
+                   side_effect=lambda: MagicMock()):
+            client = get_async_vision_client()
+            self.assertIs(get_async_vision_client(), client)
+
+            other_loop_client = await asyncio.to_thread(
+                asyncio.run, self.get_client())
+
+        self.assertIsNot(other_loop_client, client)
+
+    async def get_client(self):
+        return get_async_vision_client()
+
+
+@override_settings(TOKENIZATION_WORKERS=0)
+class AsyncViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+        }
+        self.english = Language.objects.create(name="English", code="en")
+        self.spanish = Language.objects.create(name="Spanish", code="es")
+        clear_translation_cache()
+
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+    async def test_create_text(self):
+        response = await self.async_client.post(
+            "/back/api/texts/",
+            {"text": "Hello\nworld!", "language": self.english.pk},
+            content_type="application/json",
+            headers=self.headers
+        )
+
+        self.assertEquals(response.status_code, 201)
+        text = await Text.objects.aget(pk=response.json()["id"])
+        self.assertEquals(text.text, "Hello world!")
+        self.assertTrue(text.has_finished_generation)
+        self.assertEquals(text.tokens["offsets"], [0, 6, 11])
+
+    async def test_list_texts(self):
+        await Text.objects.acreate(creator=self.user, text="Hello!")
+
+        response = await self.async_client.get(
+            "/back/api/texts/", headers=self.headers)
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.json()), 1)
+
+    async def test_authentication_is_required(self):
+        response = await self.async_client.post(
+            "/back/api/texts/",
+            {"text": "Hello!", "language": self.english.pk},
+            content_type="application/json"
+        )
+
+        self.assertEquals(response.status_code, 401)
+
+    async def test_create_translation_already_saved(self):
+        translation = await Translation.objects.acreate(
+            word_source=await Word.objects.acreate(
+                word="sunlight", language=self.english),
+            word_target=await Word.objects.acreate(
+                word="luz solar", language=self.spanish),
+            provider="microsoft"
+        )
+        await Example.objects.acreate(
+            translation=translation,
+            source_prefix="",
+            source_term="sunlight",
+            source_suffix="",
+            target_prefix="",
+            target_term="luz solar",
+            target_suffix="",
+        )
+
+        with patch("api.views.get_microsoft_translation") as provider:
+            response = await self.async_client.post(
+                "/back/api/translations/",
+                {
+                    "wordSource": {
+                        "word": "sunlight",
+                        "language": self.english.pk
+                    },
+                    "wordTarget": {
+                        "word": "null",
+                        "language": self.spanish.pk
+                    },
+                    "provider": "microsoft",
+                },
+                content_type="application/json",
+                headers=self.headers
+            )
+
+        self.assertEquals(response.status_code, 201)
+        provider.assert_not_called()
+        translations = response.json()["translations"]
+        self.assertEquals(len(translations), 1)
+        self.assertEquals(
+            translations[0]["examples"][0]["targetTerm"], "luz solar")
+
+        credit = self.user.credit
+        await self.user.arefresh_from_db()
+        self.assertLess(self.user.credit, credit)
+
+
+class FakeClock:
+    """
+    Stands for the time module: sleeping moves the clock forward at once.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@override_settings(
+    TEXT_POOL_SIZE=2,
+    TEXT_POOL_REFILL_RATE=6,
+    TEXT_POOL_LANGUAGES=["en"],
+    TEXT_POOL_LEVELS=["beginner"],
+    TEXT_POOL_LENGTHS=["50"],
+    TOKENIZATION_WORKERS=0
+)
+class TextPoolTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.english = Language.objects.create(name="English", code="en")
+
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+        client = MagicMock()
+        client.chat.completions.create.return_value.choices[0].message.content = (
+            "Once upon a time.")
+        client.chat.completions.create.return_value.choices[0].finish_reason = "stop"
+        client.chat.completions.create.return_value.usage.completion_tokens = 5
+        openai = patch.object(
+            text_pool, "get_openai_client", return_value=client)
+        openai.start()
+        self.addCleanup(openai.stop)
+
+        self.original_schedule_refill = text_pool.schedule_refill
+        refill = patch.object(text_pool, "schedule_refill")
+        self.schedule_refill = refill.start()
+        self.addCleanup(refill.stop)
+
+        self.clock = FakeClock()
+        for target in [
+            patch.object(text_pool, "time", self.clock),
+            patch.object(text_pool, "_last_generation", float("-inf")),
+        ]:
+            target.start()
+            self.addCleanup(target.stop)
+
+    def create_text(self, **data):
+        return self.client.post(
+            "/back/api/texts/",
+            {
+                "subject": "",
+                "topicShouldBeRandom": True,
+                "language": self.english.pk,
+                "level": "beginner",
+                "length": "50",
+                **data
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_refill_text_pool(self):
+        generated = text_pool.refill_text_pool(
+            self.english.pk, "beginner", "50")
+
+        self.assertEquals(generated, 2)
+        # The second text waits for the rate limit: 6 texts per minute.
+        self.assertEquals(self.clock.sleeps, [10])
+        pooled_text = PooledText.objects.first()
+        self.assertEquals(pooled_text.text, "Once upon a time.")
+        self.assertEquals(pooled_text.tokens["offsets"], [0, 5, 10, 12, 16])
+
+    def test_background_refill_is_rescheduled(self):
+        key = (self.english.pk, "beginner", "50")
+
+        with patch.object(text_pool, "_reschedule_refill") as reschedule:
+            generated = text_pool.refill_text_pool(*key, wait=False)
+
+        self.assertEquals(generated, 1)
+        self.assertEquals(self.clock.sleeps, [])
+        reschedule.assert_called_once_with(key, 10)
+
+    def test_fill_text_pool(self):
+        call_command("fill_text_pool", stdout=open(os.devnull, "w"))
+
+        self.assertEquals(PooledText.objects.count(), 2)
+
+    @override_settings(TEXT_POOL_REFILL_RATE=0)
+    def test_refill_rate_of_zero_disables_background_refills(self):
+        with patch.object(text_pool, "_submit_refill") as submit_refill:
+            self.original_schedule_refill(self.english, "beginner", "50")
+        submit_refill.assert_not_called()
+
+        call_command("fill_text_pool", stdout=open(os.devnull, "w"))
+
+        self.assertEquals(PooledText.objects.count(), 2)
+        self.assertEquals(self.clock.sleeps, [])
+
+    def test_serve_pooled_text(self):
+        text_pool.refill_text_pool(self.english.pk, "beginner", "50")
+
+        with patch("api.views.submit_job") as submit_job:
+            response = self.create_text()
+
+        self.assertEquals(response.status_code, 201)
+        submit_job.assert_not_called()
+        self.schedule_refill.assert_called_once_with(
+            self.english, "beginner", "50")
+
+        text = Text.objects.get(pk=response.json()["id"])
+        self.assertTrue(text.has_finished_generation)
+        self.assertEquals(text.text, "Once upon a time.")
+        self.assertEquals(PooledText.objects.count(), 1)
+        self.assertEquals(text_pool.get_text_pool_stats()["pools"], {
+            "en:beginner:50": 1,
+        })
+
+    def test_generate_text_when_pool_is_empty(self):
+        with patch("api.views.submit_job") as submit_job:
+            response = self.create_text()
+
+        self.assertEquals(response.status_code, 201)
+        submit_job.assert_called_once()
+        self.assertFalse(response.json()["hasFinishedGeneration"])
+
+    def test_subjects_are_not_pooled(self):
+        text_pool.refill_text_pool(self.english.pk, "beginner", "50")
+
+        with patch("api.views.submit_job") as submit_job:
+            self.create_text(subject="cats", topicShouldBeRandom=False)
+
+        submit_job.assert_called_once()
+        self.assertEquals(PooledText.objects.count(), 2)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+
+    def test_concurrent_calls_are_collapsed(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def generate():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "Hello!"
+
+        leader = threading.Thread(
+            target=lambda: results.append(flight.do("hello", generate)))
+        leader.start()
+        started.wait(5)
+
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(flight.do("hello", generate)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEquals(len(calls), 1)
+        self.assertEquals(results, ["Hello!"] * 4)
+
+    def test_exceptions_are_raised_to_every_caller(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("OpenAI is down.")
+
+        with self.assertRaises(ValueError):
+            flight.do("hello", fail)
+        # The failed call is forgotten.
+        self.assertEquals(flight.do("hello", lambda: "Hello!"), "Hello!")
+
+    async def test_concurrent_async_calls_are_collapsed(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def translate():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "Hola"
+
+        results = await asyncio.gather(
+            *[flight.ado("hello", translate) for _ in range(3)])
+
+        self.assertEquals(len(calls), 1)
+        self.assertEquals(results, ["Hola"] * 3)
+
+    def test_interrupted_leader_is_replaced(self):
+        class Interrupted(BaseException):
+            pass
+
+        flight = SingleFlight()
+        started = threading.Event()
+        results = []
+
+        def interrupted():
+            started.set()
+            time.sleep(0.05)
+            raise Interrupted()
+
+        def lead():
+            try:
+                flight.do("hello", interrupted)
+            except Interrupted:
+                results.append("interrupted")
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait(5)
+        results.append(flight.do("hello", lambda: "Hello!"))
+        leader.join(5)
+
+        self.assertEquals(sorted(results), ["Hello!", "interrupted"])
+
+    async def test_cancelled_leader_is_replaced(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def translate():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "Hola"
+
+        leader = asyncio.create_task(flight.ado("hello", translate))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.ado("hello", translate))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        self.assertEquals(await follower, "Hola")
+        self.assertEquals(len(calls), 2)
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+    async def test_cancelled_follower_does_not_cancel_the_leader(self):
+        flight = SingleFlight()
+
+        async def translate():
+            await asyncio.sleep(0.05)
+            return "Hola"
+
+        leader = asyncio.create_task(flight.ado("hello", translate))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.ado("hello", translate))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+
+        self.assertEquals(await leader, "Hola")
+
+
+@override_settings(
+    GENERATION_CACHE_ENABLED=1,
+    GENERATION_CACHE_MAX_REUSES=1,
+    TOKENIZATION_WORKERS=0
+)
+class GenerationCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.english = Language.objects.create(name="English", code="en")
+        get_generation_cache().clear()
+
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+    def generate(self, subject):
+        text = Text.objects.create(
+            subject=subject, language=self.english,
+            has_finished_generation=False)
+        ask_gpt_to_generate_a_text(text, "beginner", "50")
+        text.refresh_from_db()
+        return text
+
+    def test_generated_texts_are_reused(self):
+        with patch("api.utils.generate_text", return_value="Meow.") as generate:
+            self.generate("Cats")
+            second = self.generate("  cats ")
+            self.generate("Cats")
+
+        self.assertEquals(generate.call_count, 2)
+        self.assertEquals(second.text, "Meow.")
+        self.assertTrue(second.has_finished_generation)
+
+    def test_different_prompts_are_not_reused(self):
+        with patch("api.utils.generate_text", return_value="Meow.") as generate:
+            self.generate("Cats")
+            self.generate("Dogs")
+
+        self.assertEquals(generate.call_count, 2)
+
+    async def read(self, stream):
+        stream.finish()
+        return [chunk async for chunk in stream.listen(timeout=5)]
+
+    def test_cached_texts_are_published(self):
+        streams = []
+
+        def open_stream(text_id):
+            streams.append(GenerationStream())
+            return streams[-1]
+
+        def generate(prompt, stream, plan):
+            stream.publish("Meow.")
+            return "Meow."
+
+        with patch("api.utils.open_generation_stream", side_effect=open_stream), \
+                patch("api.utils.generate_text", side_effect=generate):
+            self.generate("Cats")
+            self.generate("Cats")
+
+        self.assertEquals(
+            [asyncio.run(self.read(stream)) for stream in streams],
+            [["Meow."], ["Meow."]])
+
+    def test_texts_being_generated_are_published_to_every_caller(self):
+        started = threading.Event()
+        release = threading.Event()
+        streams = [GenerationStream(), GenerationStream()]
+
+        def generate(prompt, stream, plan):
+            started.set()
+            release.wait(5)
+            stream.publish("Meow.")
+            return "Meow."
+
+        with patch("api.utils.generate_text", side_effect=generate) as generate_mock:
+            leader = threading.Thread(
+                target=complete_prompt, args=("Cats", streams[0], None))
+            leader.start()
+            started.wait(5)
+            follower = threading.Thread(
+                target=complete_prompt, args=("Cats", streams[1], None))
+            follower.start()
+            time.sleep(0.05)
+            release.set()
+            for thread in [leader, follower]:
+                thread.join(5)
+
+        self.assertEquals(generate_mock.call_count, 1)
+        self.assertEquals(
+            [asyncio.run(self.read(stream)) for stream in streams],
+            [["Meow."], ["Meow."]])
+
+    def test_texts_of_a_batch_about_one_subject_are_all_generated(self):
+        texts = [
+            Text.objects.create(
+                subject="Cats", language=self.english,
+                has_finished_generation=False)
+            for _ in range(3)
+        ]
+        # Thread-safe, unlike a generator: the texts are generated at once.
+        answers = itertools.count()
+
+        with patch("api.utils.generate_text",
+                   side_effect=lambda *args: f"Meow {next(answers)}.") as generate:
+            ask_gpt_to_generate_texts(
+                texts[0], [texts[1].pk, texts[2].pk], "beginner", "50")
+
+        self.assertEquals(generate.call_count, 3)
+        for text in texts:
+            text.refresh_from_db()
+        self.assertEquals(
+            sorted(text.text for text in texts), ["Meow 0.", "Meow 1.", "Meow 2."])
+
+
+@override_settings(TOKENIZATION_WORKERS=0)
+class SaveGeneratedTextTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.credit = self.user.credit
+        self.text = Text.objects.create(
+            subject="Cats", creator=self.user, has_finished_generation=False)
+
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+    def test_creator_is_charged_with_the_save(self):
+        with patch("api.utils.generate_text", return_value="Meow."), \
+                patch.object(Text, "save", side_effect=Exception("Database is down")), \
+                self.assertRaises(Exception):
+            ask_gpt_to_generate_a_text(self.text, "beginner", "50")
+
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.credit, self.credit)
+
+        # Like run_job, the retry reads the text again.
+        self.text.refresh_from_db()
+        with patch("api.utils.generate_text", return_value="Meow."):
+            ask_gpt_to_generate_a_text(self.text, "beginner", "50")
+
+        self.user.refresh_from_db()
+        self.assertEquals(
+            self.user.credit, self.credit - settings.GPT_API_CALL_COST)
+
+    def test_finished_texts_are_not_generated_again(self):
+        self.text.has_finished_generation = True
+        self.text.save()
+
+        with patch("api.utils.generate_text") as generate:
+            ask_gpt_to_generate_a_text(self.text, "beginner", "50")
+            ask_gpt_to_generate_texts(self.text, [], "beginner", "50")
+
+        generate.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.credit, self.credit)
+
+
+class TextBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.english = Language.objects.create(name="English", code="en")
+
+        model_registry.clear()
+        get_tokenization_cache().clear()
+        loader = patch.object(
+            model_registry, "_loader", lambda name, exclude: spacy.blank("en"))
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.addCleanup(model_registry.clear)
+
+    def create_texts(self, **data):
+        return self.client.post(
+            "/back/api/texts/batch/",
+            {"language": self.english.pk, "level": "beginner", **data},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_create_batch(self):
+        with patch("api.views.submit_job") as submit_job:
+            response = self.create_texts(subjects=["Cats", "Dogs", "Birds"])
+
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(
+            [text["subject"] for text in response.json()],
+            ["Cats", "Dogs", "Birds"]
+        )
+        texts = list(Text.objects.order_by("pk"))
+        self.assertEquals(len(texts), 3)
+        submit_job.assert_called_once_with(
+            texts[0],
+            ask_gpt_to_generate_texts,
+            [texts[1].pk, texts[2].pk],
+            "beginner",
+            "50",
+            texts=3
+        )
+
+    def test_create_batch_about_one_subject(self):
+        with patch("api.views.submit_job"):
+            response = self.create_texts(subject="Cats", count=2)
+
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(
+            list(Text.objects.values_list("subject", flat=True)),
+            ["Cats", "Cats"]
+        )
+
+    def test_batch_needs_credit_for_all_texts(self):
+        self.user.credit = settings.GPT_API_CALL_COST
+        self.user.save()
+
+        with patch("api.views.submit_job") as submit_job:
+            response = self.create_texts(subject="Cats", count=2)
+
+        self.assertEquals(response.status_code, 400)
+        submit_job.assert_not_called()
+        self.assertFalse(Text.objects.exists())
+
+    def test_batch_is_limited(self):
+        response = self.create_texts(
+            subject="Cats", count=settings.GENERATION_BATCH_MAX_SIZE + 1)
+
+        self.assertEquals(response.status_code, 400)
+
+    @override_settings(GENERATION_MAX_JOBS_PER_USER=2)
+    def test_batch_counts_each_text_toward_the_user_limit(self):
+        with patch("api.views.submit_job") as submit_job:
+            response = self.create_texts(subject="Cats", count=3)
+
+        self.assertEquals(response.status_code, 400)
+        submit_job.assert_not_called()
+        self.assertFalse(Text.objects.exists())
+
+    @override_settings(GENERATION_BACKEND="queue", GENERATION_MAX_JOBS_PER_USER=3)
+    def test_queued_batch_counts_each_text(self):
+        response = self.create_texts(subject="Cats", count=2)
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(GenerationJob.objects.get().texts, 2)
+
+        response = self.create_texts(subject="Dogs", count=2)
+
+        self.assertEquals(response.status_code, 429)
+
+    def test_generate_texts(self):
+        texts = [
+            Text.objects.create(
+                subject=subject, language=self.english, creator=self.user,
+                has_finished_generation=False)
+            for subject in ["Cats", "Dogs", "Birds"]
+        ]
+        credit = self.user.credit
+
+        def generate_text(prompt, stream, plan):
+            if "Dogs" in prompt:
+                raise RuntimeError("OpenAI is down")
+            return "Hello world!"
+
+        with patch("api.utils.generate_text", side_effect=generate_text), \
+                patch("api.utils.tokenize_texts", wraps=tokenize_texts) as tokenize:
+            ask_gpt_to_generate_texts(
+                texts[0], [texts[1].pk, texts[2].pk], "beginner", "50")
+
+        tokenize.assert_called_once()
+        for text in texts:
+            text.refresh_from_db()
+            self.assertTrue(text.has_finished_generation)
+
+        self.assertEquals(texts[0].text, "Hello world!")
+        self.assertEquals(texts[0].tokens["offsets"], [0, 6, 11])
+        self.assertEquals(texts[2].text, "Hello world!")
+        self.assertIsNone(texts[1].tokens)
+
+        self.user.refresh_from_db()
+        self.assertEquals(
+            self.user.credit, credit - 2 * settings.GPT_API_CALL_COST)
+
+
+class GenerationPlanTestCase(TestCase):
+
+    def test_plan_generation(self):
+        short = plan_generation("text", "en", "beginner", "50")
+        long = plan_generation("text", "en", "mastery", "400")
+
+        self.assertLess(short.max_tokens, long.max_tokens)
+        self.assertLess(short.timeout, long.timeout)
+        self.assertLessEqual(long.timeout, settings.OPENAI_TIMEOUT)
+        self.assertGreater(short.max_tokens, 50)
+        self.assertLess(short.max_tokens, 2048)
+        self.assertLess(plan_grading().max_tokens, 2048)
+
+    def test_plan_generation_by_language(self):
+        english = plan_generation("text", "en", "beginner", "200")
+        russian = plan_generation("text", "ru", "beginner", "200")
+        japanese = plan_generation("text", "ja", "beginner", "200")
+
+        self.assertGreater(russian.max_tokens, english.max_tokens)
+        self.assertGreater(japanese.max_tokens, english.max_tokens)
+        self.assertGreaterEqual(russian.max_tokens, 200 * 2.5)
+
+    def test_finish_completion(self):
+        plan = plan_generation("text", "en", "beginner", "50")
+        text = "Hello world. How are you? I am"
+
+        self.assertEquals(
+            finish_completion(plan, text, "length"),
+            "Hello world. How are you?"
+        )
+        self.assertEquals(finish_completion(plan, text, "stop"), text)
+        self.assertEquals(finish_completion(plan, "I am", "length"), "I am")
+        self.assertEquals(
+            finish_completion(plan_grading(), text, "length"), text)
+
+    def test_generate_text(self):
+        plan = plan_generation("text", "en", "beginner", "50")
+
+        chunks = []
+        for content, finish_reason in [
+                ("Hello world.", None), (" I am", None), (None, "length")]:
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = content
+            chunk.choices[0].finish_reason = finish_reason
+            chunks.append(chunk)
+
+        client = MagicMock()
+        client.chat.completions.create.return_value.__iter__.return_value = chunks
+
+        with patch("api.utils.get_openai_client", return_value=client):
+            text = generate_text("prompt", GenerationStream(), plan)
+
+        self.assertEquals(text, "Hello world.")
+        kwargs = client.chat.completions.create.call_args.kwargs
+        self.assertEquals(kwargs["max_tokens"], plan.max_tokens)
+        self.assertEquals(kwargs["timeout"], plan.timeout)
+
+        stat = GenerationStat.objects.get()
+        self.assertEquals(stat.kind, "text")
+        self.assertEquals(stat.requested_words, 50)
+        self.assertEquals(stat.words, 2)
+        self.assertEquals(stat.finish_reason, "length")
+
+    def test_generate_text_deadline(self):
+        plan = plan_generation("text", "en", "beginner", "50")
+        plan.timeout = 0.05
+
+        def generate():
+            for content in ["Once", " upon", " a", " time."]:
+                time.sleep(0.03)
+                chunk = MagicMock()
+                chunk.choices[0].delta.content = content
+                chunk.choices[0].finish_reason = None
+                yield chunk
+
+        client = MagicMock()
+        client.chat.completions.create.return_value.__iter__.side_effect = generate
+
+        with patch("api.utils.get_openai_client", return_value=client), \
+                self.assertRaises(Exception):
+            generate_text("prompt", GenerationStream(), plan)
+
+        client.chat.completions.create.return_value.close.assert_called_once()
+        self.assertEquals(GenerationStat.objects.get().finish_reason, "timeout")
+
+
+class TranslationCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.user = CustomUserModel.objects.create_user(
+            "reader", "reader@neotexto.com")
+        self.english = Language.objects.create(name="English", code="en")
+        self.spanish = Language.objects.create(name="Spanish", code="es")
+        clear_translation_cache()
+        self.addCleanup(clear_translation_cache)
+
+        self.translation = Translation.objects.create(
+            word_source=Word.objects.create(
+                word="sunlight", language=self.english),
+            word_target=Word.objects.create(
+                word="luz solar", language=self.spanish),
+            provider="microsoft"
+        )
+        self.create_example("luz solar")
+
+    def create_example(self, target_term):
+        return Example.objects.create(
+            translation=self.translation,
+            source_prefix="",
+            source_term="sunlight",
+            source_suffix="",
+            target_prefix="",
+            target_term=target_term,
+            target_suffix="",
+        )
+
+    def translate(self, word="sunlight"):
+        return self.client.post(
+            "/back/api/translations/",
+            {
+                "wordSource": {"word": word, "language": self.english.pk},
+                "wordTarget": {"word": "null", "language": self.spanish.pk},
+                "provider": "microsoft",
+            },
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_cached_translations_do_not_query_translations(self):
+        self.translate()
+
+        with CaptureQueriesContext(connection) as queries, \
+                patch("api.views.get_microsoft_translation") as provider:
+            response = self.translate()
+
+        self.assertEquals(response.status_code, 201)
+        provider.assert_not_called()
+        self.assertEquals(len(response.json()["translations"]), 1)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if "api_translation" in query["sql"] or "api_example" in query["sql"]
+        ])
+
+    def test_new_examples_invalidate_the_cache(self):
+        self.translate()
+        self.create_example("sol")
+
+        response = self.translate()
+
+        self.assertEquals(
+            [e["targetTerm"] for e in response.json()["translations"][0]["examples"]],
+            ["luz solar", "sol"]
+        )
+
+    def test_cached_translations_are_charged(self):
+        self.translate()
+        credit = CustomUserModel.objects.get(pk=self.user.pk).credit
+
+        self.translate()
+
+        self.user.refresh_from_db()
+        self.assertEquals(
+            self.user.credit, credit - settings.TRANSLATION_API_CALL_COST)
+
+    def test_words_without_translation_are_remembered(self):
+        with patch("api.views.get_microsoft_translation", return_value=[]) as provider:
+            self.translate("Zorglub")
+            response = self.translate("Zorglub")
+
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json()["translations"], [])
+        provider.assert_called_once()
+
+    def test_words_without_translation_are_asked_again_after_timeout(self):
+        with override_settings(TRANSLATION_NEGATIVE_CACHE_TIMEOUT=0), \
+                patch("api.views.get_microsoft_translation", return_value=[]) as provider:
+            self.translate("Zorglub")
+            self.translate("Zorglub")
+
+        self.assertEquals(provider.call_count, 2)
+
+    def test_new_translations_invalidate_words_without_translation(self):
+        with patch("api.views.get_microsoft_translation", return_value=[]):
+            self.translate("Zorglub")
+
+        Translation.objects.create(
+            word_source=Word.objects.create(
+                word="Zorglub", language=self.english),
+            word_target=Word.objects.create(
+                word="Zorglub", language=self.spanish),
+            provider="microsoft"
+        )
+        response = self.translate("Zorglub")
+
+        self.assertEquals(len(response.json()["translations"]), 1)
+
+    async def test_concurrent_lookups_are_collapsed(self):
+        calls = []
+
+        def translate(word, language_from, language_to, provider):
+            calls.append(word)
+            time.sleep(0.1)
+            return []
+
+        with patch("api.views.translate", side_effect=translate):
+            results = await asyncio.gather(*[
+                alookup_translations(
+                    "Zorglub", self.english, self.spanish, "microsoft")
+                for _ in range(3)
+            ])
+
+        self.assertEquals(calls, ["Zorglub"])
+        self.assertEquals([len(r["translations"]) for r in results], [0] * 3)
+
+    @override_settings(TRANSLATION_SHARED_LOCK=1)
+    def test_lookups_wait_for_other_processes(self):
+        key = get_translation_cache_key(
+            "Zorglub", self.english.pk, self.spanish.pk, "microsoft")
+        cache = get_translation_cache()
+        # Another process is looking the word up.
+        cache.set(f"{key}:lock", 1)
+        data = {"word": {"word": "Zorglub"}, "translations": []}
+
+        def finish():
+            time.sleep(0.1)
+            cache.set(key, data)
+            cache.delete(f"{key}:lock")
+
+        other_process = threading.Thread(target=finish)
+        other_process.start()
+
+        with patch("api.views.translate") as translate:
+            result = lookup_translations(
+                "Zorglub", self.english, self.spanish, "microsoft")
+        other_process.join(5)
+
+        translate.assert_not_called()
+        self.assertEquals(result, data)
+
+    @override_settings(TRANSLATION_SHARED_LOCK=1)
+    def test_lookups_do_not_wait_for_failed_processes(self):
+        key = get_translation_cache_key(
+            "Zorglub", self.english.pk, self.spanish.pk, "microsoft")
+        cache = get_translation_cache()
+        cache.set(f"{key}:lock", 1)
+        threading.Timer(0.1, cache.delete, [f"{key}:lock"]).start()
+
+        with patch("api.views.translate", return_value=[]) as translate:
+            lookup_translations(
+                "Zorglub", self.english, self.spanish, "microsoft")
+
+        translate.assert_called_once()
+        self.assertNotIn(f"{key}:lock", cache)
+
+    def test_lru_cache(self):
+        cache = LRUCache(max_entries=2, timeout=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEquals(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEquals(cache.get("c"), 3)
+
+        cache.timeout = -1
+        cache.set("d", 4)
+        self.assertIsNone(cache.get("d"))
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Paths answered with 503, or 429 for /throttled, before succeeding,
+    # and requests received.
+    failures = {}
+    received = []
+
+    def do_GET(self):
+        FakeProviderHandler.received.append(
+            (self.path, self.client_address[1], self.headers["X-ClientTraceId"]))
+
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+
+        status = 200
+        if FakeProviderHandler.failures.get(self.path):
+            FakeProviderHandler.failures[self.path] -= 1
+            status = 429 if self.path.startswith("/throttled") else 503
+
+        body = b"{}"
+        try:
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "3600")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            # The client timed out.
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(
+    PROVIDER_HTTP_TIMEOUT=0.2,
+    PROVIDER_HTTP_MAX_RETRIES=1,
+    PROVIDER_HTTP_BACKOFF=0
+)
+class ProviderClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProviderHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+        FakeProviderHandler.failures = {}
+        FakeProviderHandler.received = []
+        provider_client._session = None
+
+    def tearDown(self):
+        provider_client.get_provider_session().close()
+        provider_client._session = None
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            response = provider_client.provider_request("GET", self.url + "/")
+            self.assertEquals(response.status_code, 200)
+
+        ports = {port for _, port, _ in FakeProviderHandler.received}
+        trace_ids = {trace_id for _, _, trace_id in FakeProviderHandler.received}
+        self.assertEquals(len(ports), 1)
+        self.assertEquals(len(trace_ids), 3)
+
+    def test_server_errors_are_retried(self):
+        FakeProviderHandler.failures = {"/": 1}
+
+        response = provider_client.provider_request("GET", self.url + "/")
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(FakeProviderHandler.received), 2)
+
+    def test_retry_after_is_bounded(self):
+        FakeProviderHandler.failures = {"/throttled": 1}
+        start = time.monotonic()
+
+        response = provider_client.provider_request(
+            "GET", self.url + "/throttled")
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(FakeProviderHandler.received), 2)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_slow_providers_time_out(self):
+        with self.assertRaisesMessage(Exception, "did not answer"):
+            provider_client.provider_request("GET", self.url + "/slow")
+
+        self.assertEquals(len(FakeProviderHandler.received), 2)
+
+
+class MicroBatcherTestCase(SimpleTestCase):
+
+    def test_items_are_batched_without_window(self):
+        batches = []
+
+        def send(group, items):
+            batches.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(send, window=0, max_items=10)
+        results = batcher.submit_many("en", list(range(11)))
+
+        self.assertEquals(batches, [10, 1])
+        self.assertEquals(results, [item * 2 for item in range(11)])
+
+    def test_concurrent_items_are_batched(self):
+        batches = []
+
+        def send(group, items):
+            batches.append((group, list(items)))
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(send, window=0.2, max_items=10)
+        results = {}
+
+        def submit(word):
+            results[word] = batcher.submit(("en", "es"), word)
+
+        threads = [
+            threading.Thread(target=submit, args=(word,))
+            for word in ["sun", "moon", "star"]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEquals(len(batches), 1)
+        self.assertEquals(sorted(batches[0][1]), ["moon", "star", "sun"])
+        self.assertEquals(
+            results, {"sun": "SUN", "moon": "MOON", "star": "STAR"})
+
+    def test_batches_are_limited(self):
+        batches = []
+
+        def send(group, items):
+            batches.append(len(items))
+            return items
+
+        batcher = MicroBatcher(send, window=5, max_items=2)
+        start = time.monotonic()
+
+        results = batcher.submit_many("en", [1, 2, 3, 4])
+
+        self.assertEquals(results, [1, 2, 3, 4])
+        self.assertEquals(batches, [2, 2])
+        # Full batches are sent without waiting.
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_groups_are_not_mixed(self):
+        batches = []
+
+        def send(group, items):
+            batches.append(group)
+            return items
+
+        batcher = MicroBatcher(send, window=0, max_items=10)
+        batcher.submit("en", 1)
+        batcher.submit("fr", 2)
+
+        self.assertEquals(batches, ["en", "fr"])
+
+    def test_exceptions_are_raised_to_every_caller(self):
+        def send(group, items):
+            raise ValueError("Microsoft is down.")
+
+        batcher = MicroBatcher(send, window=0.01, max_items=10)
+
+        with self.assertRaises(ValueError):
+            batcher.submit_many("en", [1, 2])
+
+    def test_send_dictionnary_request(self):
+        response = MagicMock()
+        response.json.return_value = [{"normalizedSource": "sun"}, {"normalizedSource": "moon"}]
+
+        with patch("api.utils.translation.provider_request", return_value=response) as request:
+            results = send_dictionnary_request(
+                "/dictionary/lookup", ("en", "es"), [{"text": "sun"}, {"text": "moon"}])
+
+        request.assert_called_once()
+        self.assertEquals(request.call_args.kwargs["json"], [{"text": "sun"}, {"text": "moon"}])
+        self.assertEquals(
+            results, [[{"normalizedSource": "sun"}], [{"normalizedSource": "moon"}]])
+
+    def test_send_dictionnary_request_error(self):
+        error = MagicMock()
+        error.json.return_value = {"error": {"code": 400023}}
+        response = MagicMock()
+        response.json.return_value = [{"normalizedSource": "moon"}]
+
+        with patch("api.utils.translation.provider_request", side_effect=[error, error, response]):
+            results = send_dictionnary_request(
+                "/dictionary/lookup", ("en", "es"), [{"text": "sun"}, {"text": "moon"}])
+
+        self.assertEquals(
+            results, [{"error": {"code": 400023}}, [{"normalizedSource": "moon"}]])
+
+    def test_send_dictionnary_request_throttled(self):
+        error = MagicMock()
+        error.json.return_value = {"error": {"code": 429001}}
+
+        with patch("api.utils.translation.provider_request", return_value=error) as request:
+            results = send_dictionnary_request(
+                "/dictionary/lookup", ("en", "es"), [{"text": "sun"}, {"text": "moon"}])
+
+        request.assert_called_once()
+        self.assertEquals(
+            results, [{"error": {"code": 429001}}, {"error": {"code": 429001}}])
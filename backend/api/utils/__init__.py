@@ -1,48 +1,61 @@
-import os
-import re
-from typing import Optional
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
-import spacy
 from django.conf import settings
-from openai import OpenAI
+from django.db import transaction
 
 from api.models import Text, UserTranslation
+from api.utils.generation import get_generation_executor, mark_text_as_failed
+from api.utils.generation_cache import (
+    cache_generation,
+    generation_flight,
+    get_cached_generation,
+    get_generation_cache_key
+)
+from api.utils.generation_plan import (
+    GenerationPlan,
+    finish_completion,
+    plan_generation,
+    record_generation
+)
+from api.utils.openai_client import get_openai_client
+from api.utils.streaming import (
+    GenerationStream,
+    close_generation_stream,
+    notify_text_finished,
+    open_generation_stream
+)
+from api.utils.tokenization import (
+    tokenize_text,
+    tokenize_text_in_chunks,
+    tokenize_texts
+)
 
-WORD_SEPARATOR = "_$_"
-
-
-def split_text_with_spacy(generated_text: str, model: Optional[str]):
-    if model:
-        try:
-            nlp = spacy.load(model)
-            doc = nlp(generated_text)
-            lemmas = (
-                WORD_SEPARATOR
-                .join([token.lemma_ for token in doc])
-            )
-            text = (
-                WORD_SEPARATOR
-                .join([token.text_with_ws for token in doc])
-            )
-
-        except Exception:
-            text = lemmas = re.sub(
-                pattern=r'(\W+)',
-                repl=WORD_SEPARATOR + r'\1' + WORD_SEPARATOR,
-                string=generated_text
-            )
-
-    else:
-        text = lemmas = re.sub(
-            pattern=r'(\W+)',
-            repl=WORD_SEPARATOR + r'\1' + WORD_SEPARATOR,
-            string=generated_text
+logger = logging.getLogger(__name__)
+
+
+def get_generation_prompt(language_name: str, subject: str, level: str, length: str, words: List[str]) -> str:
+    prompt = (
+        f"Generate a text of {length} words in {language_name}"
+    )
+
+    if not subject:
+        subject = "anything"
+
+    prompt += f" about '{subject}'"
+    prompt += f" for a {level} level."
+
+    if words:
+        prompt += (
+            f" Use the five most relevant words from this list : {', '.join(words)}."
         )
 
-    return text, lemmas
+    return prompt
 
 
-def ask_gpt_to_generate_a_text(text_object: Text, level: str, length: str):
+def get_text_prompt(text_object: Text, level: str, length: str) -> str:
     list_of_words_to_use = (
         UserTranslation
         .objects
@@ -52,6 +65,8 @@ def ask_gpt_to_generate_a_text(text_object: Text, level: str, length: str):
         )
         .values_list("translation__word_source__word", flat=True)
         .distinct()
+        # Ordered, so that the same words give the same prompt.
+        .order_by("translation__word_source__word")
         [:20]
     )
 
@@ -59,76 +74,276 @@ def ask_gpt_to_generate_a_text(text_object: Text, level: str, length: str):
     if text_object.language:
         language_name = text_object.language.name
 
-    prompt = (
-        f"Generate a text of {length} words in {language_name}"
+    return get_generation_prompt(
+        language_name,
+        text_object.subject,
+        level,
+        length,
+        list_of_words_to_use
     )
 
-    subject = text_object.subject
-    if not subject:
-        subject = "anything"
 
-    prompt += f" about '{subject}'"
-    prompt += f" for a {level} level."
+def get_text_plan(text_object: Text, level: str, length: str) -> GenerationPlan:
+    language_code = "en"
+    if text_object.language:
+        language_code = text_object.language.code
 
-    if list_of_words_to_use:
-        prompt += (
-            f" Use the five most relevant words from this list : {', '.join(list_of_words_to_use)}."
+    return plan_generation("text", language_code, level, length)
+
+
+def ask_gpt_to_generate_a_text(text_object: Text, level: str, length: str):
+    # A retried job whose text was saved has nothing left to do.
+    if text_object.has_finished_generation:
+        return
+
+    prompt = get_text_prompt(text_object, level, length)
+    plan = get_text_plan(text_object, level, length)
+
+    # The text is published chunk by chunk as OpenAI streams it, for
+    # TextViewSet.stream, and saved once complete.
+    stream = open_generation_stream(text_object.pk)
+
+    try:
+        generatedText = complete_prompt(prompt, stream, plan)
+        save_generated_text(text_object, generatedText)
+
+    finally:
+        close_generation_stream(text_object.pk)
+
+
+def ask_gpt_to_generate_texts(text_object: Text, other_text_ids: List[int], level: str, length: str):
+    """
+    Generate `text_object` and the texts of `other_text_ids`, created by the
+    same request.
+
+    OpenAI is asked for settings.GENERATION_BATCH_CONCURRENCY texts at the
+    same time, on the threads of the generation executor, and the texts are
+    tokenized together once generated. Texts whose generation fails are
+    marked as failed, without failing the others. Texts of the batch with
+    the same prompt, like `count` texts about one subject, are generated
+    each, rather than answered with the same text from the cache.
+    """
+    # The texts saved, or marked as failed, by a previous attempt of a
+    # retried job are not generated again.
+    text_objects = [
+        text
+        for text in [
+            text_object,
+            *Text.objects.select_related("creator", "language").filter(pk__in=other_text_ids)
+        ]
+        if not text.has_finished_generation
+    ]
+    if not text_objects:
+        return
+
+    prompts = [
+        get_text_prompt(text, level, length) for text in text_objects
+    ]
+    plans = [
+        get_text_plan(text, level, length) for text in text_objects
+    ]
+    use_caches = [prompts.count(prompt) == 1 for prompt in prompts]
+    streams = [open_generation_stream(text.pk) for text in text_objects]
+
+    try:
+        futures = get_generation_executor().map(
+            lambda args: complete_prompt(*args),
+            list(zip(prompts, streams, plans, use_caches)),
+            settings.GENERATION_BATCH_CONCURRENCY
         )
 
+        generated = []
+        for text, future in zip(text_objects, futures):
+            try:
+                generated.append((text, future.result()))
+            except Exception:
+                logger.exception("Generation of text %s failed", text.pk)
+                mark_text_as_failed(text)
+
+        save_generated_texts(generated)
+
+    finally:
+        for text in text_objects:
+            close_generation_stream(text.pk)
+
+
+def complete_prompt(prompt: str, stream: GenerationStream, plan: GenerationPlan, use_cache: bool = True) -> str:
+    if settings.GENERATION_CACHE_ENABLED and use_cache:
+        # Identical prompts, in the cache or being generated, are answered
+        # with the same text.
+        is_generated = False
+
+        def generate():
+            nonlocal is_generated
+            is_generated = True
+            return generate_and_cache_text(prompt, stream, plan)
+
+        generatedText = get_cached_generation(prompt)
+        if generatedText is None:
+            generatedText = generation_flight.do(
+                get_generation_cache_key(prompt), generate)
+
+        # Only the text generated by this call was published chunk by chunk.
+        if not is_generated:
+            stream.publish(generatedText)
+        return generatedText
+
+    return generate_text(prompt, stream, plan)
+
+
+def generate_text(prompt: str, stream: GenerationStream, plan: GenerationPlan) -> str:
+    """
+    Ask OpenAI for a text within the limits of `plan`, and publish it to
+    `stream` chunk by chunk.
+
+    Raises
+    ------
+    Exception
+        If the text is not complete after plan.timeout seconds. The timeout
+        of the request only limits the wait for each chunk.
+    """
+    start = time.monotonic()
+    deadline = start + plan.timeout
+    finish_reason = None
+
     # To debug without calling OpenAi API, comment this
-    client = OpenAI(
-        organization=os.environ.get("OPENAI_ORGANIZATION"),
-        api_key=os.environ.get("OPENAI_API_KEY")
-    )
+    client = get_openai_client()
 
     result = client.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[
             {"role": "system", "content": prompt}
         ],
-        max_tokens=2048,
+        max_tokens=plan.max_tokens,
+        timeout=plan.timeout,
+        stream=True,
     )
-    generatedText = result.choices[0].message.content or ""
 
-    if text_object.creator:
-        text_object.creator.credit -= settings.GPT_API_CALL_COST
-        text_object.creator.save()
+    chunks = []
+    try:
+        for chunk in result:
+            if not chunk.choices:
+                continue
+
+            content = chunk.choices[0].delta.content
+            if content:
+                chunks.append(content)
+                stream.publish(content)
+
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+
+            if finish_reason is None and time.monotonic() > deadline:
+                record_generation(
+                    plan, "".join(chunks), "timeout", time.monotonic() - start)
+                raise Exception(
+                    "The text took too long to generate. Please, retry.")
+    finally:
+        # Give the connection back to the pool even if reading failed.
+        result.close()
+
+    generatedText = "".join(chunks)
 
     # And uncomment this
     # generatedText = "..."
 
+    generatedText = finish_completion(plan, generatedText, finish_reason)
+    record_generation(
+        plan, generatedText, finish_reason, time.monotonic() - start)
+
+    return generatedText
+
+
+def generate_and_cache_text(prompt: str, stream: GenerationStream, plan: GenerationPlan) -> str:
+    generatedText = generate_text(prompt, stream, plan)
+    if generatedText:
+        cache_generation(prompt, generatedText)
+    return generatedText
+
+
+def save_generated_text(text_object: Text, generatedText: str):
+    """
+    Tokenize and save a generated text, and charge its creator in the same
+    transaction, so that a job failing before the text is saved is retried
+    without having been charged.
+    """
     language_code = "en"
     if text_object.language:
         language_code = text_object.language.code
 
-    model = get_model_from_language(language_code)
-    text, lemmas = split_text_with_spacy(generatedText, model)
+    text, tokens = tokenize_text(generatedText, language_code)
+
+    with transaction.atomic():
+        text_object.text = text
+        text_object.tokens = tokens
+        text_object.has_finished_generation = True
+        text_object.save()
+
+        if text_object.creator:
+            text_object.creator.credit -= settings.GPT_API_CALL_COST
+            text_object.creator.save()
+
+    notify_text_finished()
+
+
+def save_generated_texts(generated: List[Tuple[Text, str]]):
+    """
+    Tokenize generated texts in one batch and save them with one query,
+    charging their creators in the same transaction.
+    """
+    if not generated:
+        return
+
+    tokenized_texts = tokenize_texts([
+        (generatedText, text_object.language.code if text_object.language else "en")
+        for text_object, generatedText in generated
+    ])
 
-    text_object.text = text
-    text_object.lemmas = lemmas
-    text_object.has_finished_generation = True
-    text_object.save()
+    costs: Dict[int, int] = defaultdict(int)
+    creators = {}
+    text_objects = []
+    for (text_object, _), (text, tokens) in zip(generated, tokenized_texts):
+        text_object.text = text
+        text_object.tokens = tokens
+        text_object.has_finished_generation = True
+        text_objects.append(text_object)
 
+        if text_object.creator:
+            costs[text_object.creator.pk] += settings.GPT_API_CALL_COST
+            creators[text_object.creator.pk] = text_object.creator
+
+    with transaction.atomic():
+        Text.objects.bulk_update(
+            text_objects, ["text", "tokens", "has_finished_generation"])
+
+        for pk, cost in costs.items():
+            creators[pk].credit -= cost
+            creators[pk].save()
+
+    notify_text_finished()
+
+
+def tokenize_text_object_in_chunks(text_object: Text, text: str):
+    """
+    Tokenize a long text chunk by chunk and save the text after each chunk,
+    so that its beginning can be read while the rest is being processed.
+    Each chunk is also published for TextViewSet.stream, like the chunks of
+    a generated text.
+    """
+    language_code = None
+    if text_object.language:
+        language_code = text_object.language.code
+
+    stream = open_generation_stream(text_object.pk)
 
-def get_model_from_language(language_code):
     try:
-        if language_code == "fr":
-            return "fr_core_news_lg"
-        if language_code == "en":
-            return "en_core_web_lg"
-        if language_code == "ru":
-            return "ru_core_news_lg"
-        if language_code == "de":
-            return "de_core_news_lg"
-        if language_code == "ja":
-            return "ja_core_news_lg"
-        if language_code == "zh":
-            return "zh_core_web_lg"
-        if language_code == "it":
-            return "it_core_news_lg"
-        if language_code == "pt":
-            return "pt_core_news_lg"
-
-    except Exception:
-        pass
-    return None
+        for tokenized_text, tokens in tokenize_text_in_chunks(text, language_code):
+            stream.publish(tokenized_text[len(text_object.text):])
+            text_object.text = tokenized_text
+            text_object.tokens = tokens
+            text_object.save(update_fields=["text", "tokens"])
+
+    finally:
+        text_object.has_finished_generation = True
+        text_object.save(update_fields=["has_finished_generation"])
+        close_generation_stream(text_object.pk)
+        notify_text_finished()
@@ -0,0 +1,303 @@
+import logging
+import threading
+import traceback
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.models import GenerationJob, Text
+from api.utils.streaming import notify_text_finished
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationBusy(Exception):
+    """
+    Raised when a generation job cannot be accepted right now.
+    """
+
+
+class GenerationExecutor:
+    """
+    Run background generation jobs on a bounded pool of threads.
+
+    Parameters
+    ----------
+    max_workers : int
+        Number of jobs running at the same time.
+
+    queue_size : int
+        Number of jobs waiting for a worker. Jobs submitted when the queue is
+        full are rejected with GenerationBusy.
+
+    max_jobs_per_user : int
+        Number of jobs, running or waiting, a single user can have. 0 means
+        no limit.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, max_jobs_per_user: int = 0):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.max_jobs_per_user = max_jobs_per_user
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="generation"
+        )
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._jobs_per_user: Dict[Any, int] = defaultdict(int)
+
+    def submit(self, fn: Callable, *args, user: Optional[Any] = None, weight: int = 1) -> Future:
+        """
+        Schedule `fn(*args)`, on behalf of the user whose primary key is
+        `user`. The job counts as `weight` jobs toward the limits, like a
+        batch generating one text per unit of weight.
+
+        Raises
+        ------
+        GenerationBusy
+            If the queue is full or the user already has too many jobs.
+        """
+        with self._lock:
+            if self._jobs + weight > self.max_workers + self.queue_size:
+                raise GenerationBusy(
+                    "The server is busy. Please, retry in a few seconds."
+                )
+            if (user is not None
+                    and self.max_jobs_per_user
+                    and self._jobs_per_user[user] + weight > self.max_jobs_per_user):
+                raise GenerationBusy(
+                    "You already have texts being generated. Please, retry once they are ready."
+                )
+
+            self._jobs += weight
+            if user is not None:
+                self._jobs_per_user[user] += weight
+
+        try:
+            return self._executor.submit(self._run, fn, args, user, weight)
+        except Exception:
+            self._release(user, weight)
+            raise
+
+    def map(self, fn: Callable, items: List[Any], concurrency: int) -> List[Future]:
+        """
+        Run `fn(item)` for each of `items`, at most `concurrency` at the
+        same time, and wait for them. Meant for a job to split its work:
+        the items run in the thread of the job and in threads of the pool,
+        so that they stay within max_workers, and count toward the limits
+        through the weight of the job.
+
+        Returns
+        -------
+        futures : List[Future]
+            The result, or exception, of each item.
+        """
+        futures = [Future() for _ in items]
+        remaining = list(zip(items, futures))
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if not remaining:
+                        return
+                    item, future = remaining.pop(0)
+
+                future.set_running_or_notify_cancel()
+                try:
+                    future.set_result(fn(item))
+                except Exception as e:
+                    future.set_exception(e)
+
+        def work_in_pool():
+            close_old_connections()
+            try:
+                work()
+            finally:
+                close_old_connections()
+
+        # Helpers which start once all the items are taken return at once,
+        # so the job never waits for an item no thread has started.
+        for _ in range(min(concurrency, len(items)) - 1):
+            self._executor.submit(work_in_pool)
+        work()
+
+        wait(futures)
+        return futures
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "jobs": self._jobs,
+                "max_workers": self.max_workers,
+                "queue_size": self.queue_size,
+            }
+
+    def _run(self, fn: Callable, args, user: Optional[Any], weight: int):
+        close_old_connections()
+        try:
+            return fn(*args)
+        except Exception:
+            logger.exception("Generation job %s failed", fn.__name__)
+            # Like run_job, so that clients waiting for the text stop.
+            if args and isinstance(args[0], Text):
+                try:
+                    mark_text_as_failed(args[0])
+                except Exception:
+                    logger.exception("Could not mark text %s as failed", args[0].pk)
+            raise
+        finally:
+            close_old_connections()
+            self._release(user, weight)
+
+    def _release(self, user: Optional[Any], weight: int):
+        with self._lock:
+            self._jobs -= weight
+            if user is not None:
+                self._jobs_per_user[user] -= weight
+                if not self._jobs_per_user[user]:
+                    del self._jobs_per_user[user]
+
+
+_generation_executor: Optional[GenerationExecutor] = None
+_generation_executor_lock = threading.Lock()
+
+
+def get_generation_executor() -> GenerationExecutor:
+    global _generation_executor
+
+    with _generation_executor_lock:
+        if _generation_executor is None:
+            _generation_executor = GenerationExecutor(
+                max_workers=settings.GENERATION_MAX_WORKERS,
+                queue_size=settings.GENERATION_QUEUE_SIZE,
+                max_jobs_per_user=settings.GENERATION_MAX_JOBS_PER_USER,
+            )
+        return _generation_executor
+
+
+def enqueue_job(text_object: Text, task: str, arguments: List[Any], texts: int = 1) -> GenerationJob:
+    """
+    Store a job running `task(text_object, *arguments)` in the database,
+    for run_generation_worker to pick up. The job counts as `texts` jobs
+    toward settings.GENERATION_MAX_JOBS_PER_USER.
+
+    Raises
+    ------
+    GenerationBusy
+        If the creator of the text already has too many jobs in flight.
+    """
+    if (text_object.creator_id is not None
+            and settings.GENERATION_MAX_JOBS_PER_USER):
+        jobs = (
+            GenerationJob
+            .objects
+            .filter(
+                text__creator_id=text_object.creator_id,
+                status__in=["pending", "running"]
+            )
+            .aggregate(texts=Sum("texts"))["texts"]
+        ) or 0
+        if jobs + texts > settings.GENERATION_MAX_JOBS_PER_USER:
+            raise GenerationBusy(
+                "You already have texts being generated. Please, retry once they are ready."
+            )
+
+    return GenerationJob.objects.create(
+        text=text_object,
+        task=task,
+        arguments=arguments,
+        texts=texts,
+    )
+
+
+def claim_job() -> Optional[GenerationJob]:
+    """
+    Lock and return the next job to run, or None if there is none.
+
+    Jobs left running by a worker that died for longer than
+    settings.GENERATION_JOB_TIMEOUT are claimed again. On PostgreSQL, rows
+    are locked with SELECT ... FOR UPDATE SKIP LOCKED, so that several
+    workers never claim the same job.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.GENERATION_JOB_TIMEOUT)
+
+    with transaction.atomic():
+        job = (
+            GenerationJob
+            .objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status="pending", run_after__lte=now)
+                | Q(status="running", locked_at__lt=stale)
+            )
+            .order_by("run_after")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = "running"
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=["status", "locked_at", "attempts", "updated_at"])
+
+    return job
+
+
+def run_job(job: GenerationJob):
+    """
+    Run a claimed job. Failed jobs are retried with an exponential backoff
+    until settings.GENERATION_JOB_MAX_ATTEMPTS, then marked as failed along
+    with their text.
+    """
+    text_object = (
+        Text
+        .objects
+        .select_related("creator", "language")
+        .filter(pk=job.text_id)
+        .first()
+    )
+    if text_object is None:
+        # The text, and so the job, has been deleted meanwhile.
+        return
+
+    try:
+        import_string(job.task)(text_object, *job.arguments)
+
+    except Exception:
+        logger.exception("Generation job %s failed", job.pk)
+        job.last_error = traceback.format_exc()
+
+        if job.attempts < settings.GENERATION_JOB_MAX_ATTEMPTS:
+            job.status = "pending"
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.GENERATION_JOB_BACKOFF * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = "failed"
+            mark_text_as_failed(text_object)
+
+    else:
+        job.status = "done"
+
+    job.locked_at = None
+    job.save()
+
+
+def mark_text_as_failed(text_object: Text):
+    text_object.text = "The generation of this text failed. Please, try again."
+    text_object.tokens = None
+    text_object.has_finished_generation = True
+    text_object.save(update_fields=["text", "tokens", "has_finished_generation"])
+    notify_text_finished()
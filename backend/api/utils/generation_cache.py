@@ -0,0 +1,60 @@
+import hashlib
+import logging
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Concurrent generations of the same prompt in this process.
+generation_flight = SingleFlight()
+
+
+def get_generation_cache():
+    return caches["generations"]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+def get_generation_cache_key(prompt: str) -> str:
+    digest = hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+    return f"generation:{digest}"
+
+
+def get_cached_generation(prompt: str) -> Optional[str]:
+    """
+    Return a text generated earlier for the same prompt, unless it has
+    already been served settings.GENERATION_CACHE_MAX_REUSES times.
+    """
+    cache = get_generation_cache()
+    key = get_generation_cache_key(prompt)
+
+    text = cache.get(key)
+    if text is None:
+        return None
+
+    try:
+        reuses = cache.incr(f"{key}:reuses")
+    except ValueError:
+        # The counter expired before the text.
+        return None
+
+    if reuses > settings.GENERATION_CACHE_MAX_REUSES:
+        return None
+
+    logger.info("Reusing a generated text (%s/%s)",
+                reuses, settings.GENERATION_CACHE_MAX_REUSES)
+    return text
+
+
+def cache_generation(prompt: str, text: str):
+    cache = get_generation_cache()
+    key = get_generation_cache_key(prompt)
+
+    cache.set_many({key: text, f"{key}:reuses": 0})
@@ -0,0 +1,181 @@
+import logging
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+
+from api.models import GenerationStat
+
+logger = logging.getLogger(__name__)
+
+# Words are longer, so split in more tokens, at higher levels.
+LEVEL_TOKEN_FACTORS = {
+    "beginner": 1.0,
+    "intermediate": 1.1,
+    "advanced": 1.2,
+    "mastery": 1.3,
+}
+
+# Languages OpenAI splits in more tokens per word than those written in the
+# Latin alphabet, which settings.GENERATION_TOKENS_PER_WORD is tuned for.
+LANGUAGE_TOKEN_FACTORS = {
+    "ru": 1.6,
+    "uk": 1.6,
+    "el": 1.8,
+    "ar": 1.6,
+    "he": 1.6,
+    "hi": 2.0,
+    "ja": 1.6,
+    "zh": 1.6,
+    "ko": 1.6,
+}
+
+SENTENCE_END = re.compile(r"[.!?…。！？][\"'»”)\]]*(?=\s|$)")
+
+
+class GenerationPlan:
+    """
+    Limits of a completion asked to OpenAI.
+
+    Parameters
+    ----------
+    kind : str
+        "text", "pooled" or "grading", see GenerationStat.
+
+    max_tokens : int
+        Completions are cut after this many tokens.
+
+    timeout : float
+        Seconds after which the completion is abandoned.
+
+    trim_to_sentence : bool
+        Whether a completion cut by max_tokens is trimmed to its last
+        complete sentence.
+
+    language_code, level, requested_words
+        What was asked, recorded with the actual size of the completion.
+    """
+
+    def __init__(
+            self,
+            kind: str,
+            max_tokens: int,
+            timeout: float,
+            trim_to_sentence: bool = False,
+            language_code: str = "",
+            level: str = "",
+            requested_words: Optional[int] = None):
+        self.kind = kind
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.trim_to_sentence = trim_to_sentence
+        self.language_code = language_code
+        self.level = level
+        self.requested_words = requested_words
+
+
+def _get_timeout(max_tokens: int) -> float:
+    return min(
+        settings.GENERATION_TIMEOUT_BASE
+        + max_tokens / settings.GENERATION_TOKENS_PER_SECOND,
+        settings.OPENAI_TIMEOUT
+    )
+
+
+def plan_generation(kind: str, language_code: Optional[str], level: str, length: str) -> GenerationPlan:
+    """
+    Plan the generation of a text of `length` words at `level`: enough
+    tokens for about settings.GENERATION_TOKENS_PER_WORD tokens per word,
+    more in the languages of LANGUAGE_TOKEN_FACTORS, and the time OpenAI
+    takes to write them.
+    """
+    words = int(length)
+    max_tokens = int(
+        words
+        * settings.GENERATION_TOKENS_PER_WORD
+        * LANGUAGE_TOKEN_FACTORS.get(language_code or "", 1.0)
+        * LEVEL_TOKEN_FACTORS.get(level, 1.0)
+    ) + settings.GENERATION_EXTRA_TOKENS
+
+    return GenerationPlan(
+        kind,
+        max_tokens,
+        _get_timeout(max_tokens),
+        trim_to_sentence=True,
+        language_code=language_code or "",
+        level=level,
+        requested_words=words,
+    )
+
+
+def plan_grading() -> GenerationPlan:
+    """
+    Plan the brief answer of the sentence game.
+    """
+    return GenerationPlan(
+        "grading",
+        settings.GRADING_MAX_TOKENS,
+        _get_timeout(settings.GRADING_MAX_TOKENS),
+    )
+
+
+def finish_completion(plan: GenerationPlan, text: str, finish_reason: Optional[str]) -> str:
+    """
+    Trim a completion cut by max_tokens to its last complete sentence, if
+    the plan asks for it and the completion has one.
+    """
+    if finish_reason != "length" or not plan.trim_to_sentence:
+        return text
+
+    ends = list(SENTENCE_END.finditer(text))
+    if not ends:
+        return text
+    return text[:ends[-1].end()]
+
+
+def record_generation(
+        plan: GenerationPlan,
+        text: str,
+        finish_reason: Optional[str],
+        duration: float,
+        completion_tokens: Optional[int] = None):
+    """
+    Record the size of a completion, next to what was asked. Failures are
+    logged, not raised: the completion matters more than its stats.
+    """
+    try:
+        with transaction.atomic():
+            GenerationStat.objects.create(
+                kind=plan.kind,
+                language_code=plan.language_code,
+                level=plan.level,
+                requested_words=plan.requested_words,
+                words=len(text.split()),
+                max_tokens=plan.max_tokens,
+                completion_tokens=completion_tokens,
+                finish_reason=finish_reason or "",
+                duration=duration,
+            )
+    except Exception:
+        logger.exception("Could not record the generation stats")
+
+
+def get_generation_stats():
+    """
+    Aggregate the recorded completions by kind, level and requested words.
+    """
+    return (
+        GenerationStat
+        .objects
+        .values("kind", "level", "requested_words")
+        .annotate(
+            count=Count("pk"),
+            average_words=Avg("words"),
+            average_completion_tokens=Avg("completion_tokens"),
+            average_duration=Avg("duration"),
+            truncated=Count("pk", filter=Q(finish_reason="length")),
+        )
+        .order_by("kind", "level", "requested_words")
+    )
@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class _Batch:
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Send the items submitted by concurrent threads in batches.
+
+    The first item of a group opens a batch, which collects the items of
+    the same group submitted in the next `window` seconds, or until it holds
+    `max_items` items. The batch is then sent with one call of
+    `send(group, items)`, by the thread which opened it, and each caller
+    gets the result of its items.
+
+    Parameters
+    ----------
+    send : Callable[[Hashable, List], List]
+        Sends the items of a group and returns one result per item, in the
+        order of the items. An exception is raised to the callers of all
+        the items.
+
+    window : float
+        Seconds a batch waits for more items. 0 sends the items of each call
+        at once, in batches of `max_items`.
+
+    max_items : int
+        Number of items of a batch.
+    """
+
+    def __init__(self, send: Callable[[Hashable, List[Any]], List[Any]], window: float, max_items: int):
+        self.send = send
+        self.window = window
+        self.max_items = max_items
+
+        self._lock = threading.Lock()
+        self._batches: Dict[Hashable, _Batch] = {}
+
+    def submit(self, group: Hashable, item: Any) -> Any:
+        return self.submit_many(group, [item])[0]
+
+    def submit_many(self, group: Hashable, items: List[Any]) -> List[Any]:
+        """
+        Send `items` with the items of the same group submitted at the same
+        time, and return their results.
+        """
+        if not items:
+            return []
+
+        if self.window <= 0:
+            return [
+                result
+                for start in range(0, len(items), self.max_items)
+                for result in self._send_items(
+                    group, items[start:start + self.max_items])
+            ]
+
+        futures: List[Future] = []
+        opened: List[_Batch] = []
+
+        with self._lock:
+            for item in items:
+                batch = self._batches.get(group)
+                if batch is None:
+                    batch = self._batches[group] = _Batch()
+                    opened.append(batch)
+
+                future = Future()
+                batch.items.append(item)
+                batch.futures.append(future)
+                futures.append(future)
+
+                if len(batch.items) >= self.max_items:
+                    del self._batches[group]
+                    batch.full.set()
+
+        for batch in opened:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batches.get(group) is batch:
+                    del self._batches[group]
+            self._send_batch(group, batch)
+
+        return [future.result() for future in futures]
+
+    def _send_items(self, group: Hashable, items: List[Any]) -> List[Any]:
+        results = self.send(group, items)
+        if len(results) != len(items):
+            raise ValueError(
+                f"{len(items)} items were sent but {len(results)} results received."
+            )
+        return results
+
+    def _send_batch(self, group: Hashable, batch: _Batch):
+        try:
+            results = self._send_items(group, batch.items)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+        else:
+            for future, result in zip(batch.futures, results):
+                future.set_result(result)
@@ -0,0 +1,481 @@
+import gc
+import logging
+import os
+import re
+import resource
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import spacy
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Components excluded from the pipeline of each profile. We only read
+# token.lemma_, token.idx and sentence boundaries, which the "lemma" profile
+# still computes: lemmatizers depend on the tagger, morphologizer and
+# attribute_ruler, never on the parser or the entity recognizer. Static
+# vectors stay loaded because tok2vec layers use them as features.
+PIPELINE_PROFILES = {
+    "full": [],
+    "lemma": [
+        "parser",
+        "ner",
+        "entity_linker",
+        "entity_ruler",
+        "span_finder",
+        "spancat",
+        "textcat",
+        "textcat_multilabel",
+    ],
+}
+
+
+def get_resident_memory() -> int:
+    """
+    Return the resident set size of the current process, in bytes.
+
+    Notes
+    -----
+    /proc is read when available because it gives the current value. Other
+    platforms fall back to the peak resident size reported by getrusage.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadedModel:
+    def __init__(self, name: str, profile: str, nlp: Any, load_time: float, memory: int):
+        self.name = name
+        self.profile = profile
+        self.nlp = nlp
+        self.load_time = load_time
+        self.memory = memory
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "profile": self.profile,
+            "pipeline": getattr(self.nlp, "pipe_names", []),
+            "load_time": round(self.load_time, 3),
+            "memory": self.memory,
+        }
+
+
+def get_model_from_language(language_code):
+    try:
+        if language_code == "fr":
+            return "fr_core_news_lg"
+        if language_code == "en":
+            return "en_core_web_lg"
+        if language_code == "ru":
+            return "ru_core_news_lg"
+        if language_code == "de":
+            return "de_core_news_lg"
+        if language_code == "ja":
+            return "ja_core_news_lg"
+        if language_code == "zh":
+            return "zh_core_web_lg"
+        if language_code == "it":
+            return "it_core_news_lg"
+        if language_code == "pt":
+            return "pt_core_news_lg"
+
+    except Exception:
+        pass
+    return None
+
+
+def get_pipeline_profile(language_code: Optional[str]) -> str:
+    return settings.SPACY_PIPELINE_PROFILES.get(
+        language_code,
+        settings.SPACY_DEFAULT_PIPELINE_PROFILE
+    )
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded spaCy pipelines.
+
+    Each model is loaded once per process. Concurrent first requests for the
+    same model wait on a single load instead of each calling spacy.load().
+
+    Parameters
+    ----------
+    max_models : int
+        Maximum number of models kept loaded. 0 means no limit.
+
+    max_memory : int
+        Maximum memory, in bytes, taken by loaded models. 0 means no limit.
+
+    pinned : Iterable[str]
+        Names of models that are never evicted.
+
+    Notes
+    -----
+    When a budget is exceeded after a load, the least recently used models
+    that are not pinned are evicted until the registry fits again. Pinned
+    models may on their own exceed the budget.
+    """
+
+    def __init__(
+            self,
+            loader=None,
+            max_models: int = 0,
+            max_memory: int = 0,
+            pinned: Optional[Iterable[str]] = None):
+        self._loader = loader
+        self._models: "OrderedDict[Tuple[str, str], LoadedModel]" = OrderedDict()
+        self._loading_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.max_models = max_models
+        self.max_memory = max_memory
+        self.pinned = set(pinned or [])
+
+    def get(self, name: str, profile: str = "full"):
+        """
+        Return the pipeline called `name` loaded with the components of
+        `profile` (see PIPELINE_PROFILES), loading it on first use.
+
+        Raises
+        ------
+        OSError
+            If spaCy cannot find the model.
+        """
+        key = (name, profile)
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model.nlp
+
+            loading_lock = self._loading_locks.setdefault(
+                key, threading.Lock())
+
+        with loading_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(name, profile)
+                with self._lock:
+                    self._models[key] = model
+                    evicted = self._evict(keep=key)
+
+                if evicted:
+                    gc.collect()
+
+        return model.nlp
+
+    def is_loaded(self, name: str, profile: str = "full") -> bool:
+        return (name, profile) in self._models
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {**model.as_dict(), "pinned": model.name in self.pinned}
+                for model in self._models.values()
+            ]
+
+    def memory(self) -> int:
+        return sum(model.memory for model in self._models.values())
+
+    def _is_over_budget(self) -> bool:
+        if self.max_models and len(self._models) > self.max_models:
+            return True
+        if self.max_memory and self.memory() > self.max_memory:
+            return True
+        return False
+
+    def _evict(self, keep: Tuple[str, str]) -> List[Tuple[str, str]]:
+        """
+        Evict least recently used models until the budget is respected.
+        Must be called with the registry lock held.
+        """
+        evicted = []
+        candidates = [
+            key for key in self._models
+            if key != keep and key[0] not in self.pinned
+        ]
+
+        while self._is_over_budget() and candidates:
+            key = candidates.pop(0)
+            del self._models[key]
+            evicted.append(key)
+            logger.info("Evicted spaCy model %s (%s)", *key)
+
+        if self._is_over_budget():
+            logger.warning(
+                "spaCy models exceed their budget: %s loaded, %.1f MB",
+                len(self._models),
+                self.memory() / (1024 * 1024),
+            )
+
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def _load(self, name: str, profile: str) -> LoadedModel:
+        memory_before = get_resident_memory()
+        start = time.perf_counter()
+
+        loader = self._loader or spacy.load
+        nlp = loader(name, exclude=PIPELINE_PROFILES[profile])
+
+        # Sentence boundaries are stored with the tokens. Without the parser
+        # (or an enabled senter), a rule-based sentencizer sets them.
+        pipe_names = getattr(nlp, "pipe_names", None)
+        if (pipe_names is not None
+                and "parser" not in pipe_names
+                and "senter" not in pipe_names):
+            nlp.add_pipe("sentencizer")
+
+        load_time = time.perf_counter() - start
+        memory = max(get_resident_memory() - memory_before, 0)
+
+        logger.info(
+            "Loaded spaCy model %s (%s) in %.2fs (%.1f MB)",
+            name,
+            profile,
+            load_time,
+            memory / (1024 * 1024),
+        )
+        return LoadedModel(name, profile, nlp, load_time, memory)
+
+
+model_registry = ModelRegistry(
+    max_models=settings.SPACY_MODEL_CACHE_MAX_MODELS,
+    max_memory=settings.SPACY_MODEL_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    pinned=filter(None, map(get_model_from_language,
+                  settings.SPACY_PINNED_LANGUAGES)),
+)
+
+
+def build_tokens(offsets: List[int], lemmas: List[str], sentences: List[int]) -> Dict[str, Any]:
+    """
+    Build the structured tokens of a text, as stored in Text.tokens.
+
+    Parameters
+    ----------
+    offsets : List[int]
+        The offset in the text, in code points, where each token starts. A
+        token ends where the next one starts and includes its trailing
+        whitespace.
+
+    lemmas : List[str]
+        The lemma of each token.
+
+    sentences : List[int]
+        The index of the first token of each sentence.
+
+    Returns
+    -------
+    tokens : Dict
+        `offsets` and `sentences` as given, the distinct `lemmas` of the text
+        and, in `lemma_ids`, the index of the lemma of each token.
+    """
+    lemma_ids: Dict[str, int] = {}
+    ids = [lemma_ids.setdefault(lemma, len(lemma_ids)) for lemma in lemmas]
+
+    return {
+        "offsets": offsets,
+        "lemmas": list(lemma_ids),
+        "lemma_ids": ids,
+        "sentences": sentences,
+    }
+
+
+def split_text_without_model(text: str) -> Dict[str, Any]:
+    words = [word for word in re.split(r'(\W+)', text) if word]
+
+    offsets = []
+    sentences = [0] if words else []
+    offset = 0
+
+    for idx, word in enumerate(words):
+        offsets.append(offset)
+        offset += len(word)
+        if re.search(r'[.!?\n]', word) and idx + 1 < len(words):
+            sentences.append(idx + 1)
+
+    return build_tokens(offsets, words, sentences)
+
+
+def split_doc(doc) -> Dict[str, Any]:
+    if doc.has_annotation("SENT_START"):
+        sentences = [sentence.start for sentence in doc.sents]
+    else:
+        sentences = [0] if len(doc) else []
+
+    return build_tokens(
+        [token.idx for token in doc],
+        [token.lemma_ for token in doc],
+        sentences
+    )
+
+
+def split_text_with_spacy(generated_text: str, model: Optional[str], profile: str = "full") -> Tuple[Dict[str, Any], bool]:
+    """
+    Split a text with the spaCy model `model`, or without a model when
+    there is none for the language or it cannot be used.
+
+    Returns
+    -------
+    tokens, fallback : Tuple[Dict, bool]
+        The tokens of the text (see build_tokens), and whether they were
+        split without a model because `model` could not be used.
+    """
+    if model:
+        try:
+            nlp = model_registry.get(model, profile)
+            return split_doc(nlp(generated_text)), False
+
+        except Exception:
+            logger.exception("Could not split a text with %s", model)
+            return split_text_without_model(generated_text), True
+
+    return split_text_without_model(generated_text), False
+
+
+def split_texts_with_spacy(
+        texts: List[str],
+        model: Optional[str],
+        profile: str = "full",
+        batch_size: int = 64,
+        n_process: int = 1) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Batched version of split_text_with_spacy, using nlp.pipe().
+
+    Parameters
+    ----------
+    texts : List[str]
+        The texts to split, all in the language of `model`.
+
+    model : Optional[str]
+        The name of the spaCy model to use.
+
+    profile : str
+        The pipeline profile to load the model with.
+
+    batch_size : int
+        Number of texts spaCy processes at once.
+
+    n_process : int
+        Number of processes nlp.pipe() uses.
+
+    Returns
+    -------
+    results, fallback : Tuple[List[Dict], bool]
+        The tokens of each text (see build_tokens), in the order of `texts`,
+        and whether they were split without a model because `model` could
+        not be used.
+    """
+    if model:
+        try:
+            nlp = model_registry.get(model, profile)
+            return [
+                split_doc(doc)
+                for doc in nlp.pipe(
+                    texts,
+                    batch_size=batch_size,
+                    n_process=n_process
+                )
+            ], False
+
+        except Exception:
+            logger.exception("Could not split texts with %s", model)
+            return [split_text_without_model(text) for text in texts], True
+
+    return [split_text_without_model(text) for text in texts], False
+
+
+def merge_tokens(tokens: Dict[str, Any], other: Dict[str, Any], offset: int) -> Dict[str, Any]:
+    """
+    Append the tokens of a text starting at `offset` to `tokens`. Used to
+    build the tokens of a text tokenized in chunks.
+    """
+    lemma_ids = {lemma: idx for idx, lemma in enumerate(tokens["lemmas"])}
+    ids = [
+        lemma_ids.setdefault(other["lemmas"][idx], len(lemma_ids))
+        for idx in other["lemma_ids"]
+    ]
+    token_count = len(tokens["offsets"])
+
+    return {
+        "offsets": tokens["offsets"] + [start + offset for start in other["offsets"]],
+        "lemmas": list(lemma_ids),
+        "lemma_ids": tokens["lemma_ids"] + ids,
+        "sentences": tokens["sentences"] + [idx + token_count for idx in other["sentences"]],
+    }
+
+
+def get_words(text: str, tokens: Dict[str, Any]) -> List[str]:
+    """
+    Return the words of a text, with their trailing whitespace.
+    """
+    offsets = tokens["offsets"]
+    ends = offsets[1:] + [len(text)]
+    return [text[start:end] for start, end in zip(offsets, ends)]
+
+
+_warm_up_started = threading.Event()
+_warm_up_finished = threading.Event()
+
+
+def warm_up(language_codes: Iterable[str]):
+    """
+    Load the models of the given languages into the registry.
+
+    Models that cannot be loaded are logged and skipped so that a missing
+    model never prevents the process from becoming ready.
+    """
+    try:
+        for language_code in language_codes:
+            model = get_model_from_language(language_code)
+            if not model:
+                logger.warning(
+                    "No spaCy model for language %s, skipping warm-up",
+                    language_code,
+                )
+                continue
+
+            try:
+                model_registry.get(model, get_pipeline_profile(language_code))
+            except Exception:
+                logger.exception("Could not warm up spaCy model %s", model)
+    finally:
+        _warm_up_finished.set()
+
+
+def start_warm_up(block: bool = False):
+    """
+    Start warming up the models of settings.SPACY_WARMUP_LANGUAGES.
+
+    The warm-up runs in a background thread unless `block` is True. It is
+    started at most once per process.
+    """
+    if _warm_up_started.is_set():
+        return
+    _warm_up_started.set()
+
+    if block:
+        warm_up(settings.SPACY_WARMUP_LANGUAGES)
+    else:
+        threading.Thread(
+            target=warm_up,
+            args=[settings.SPACY_WARMUP_LANGUAGES],
+            daemon=True
+        ).start()
+
+
+def is_ready() -> bool:
+    if not settings.SPACY_WARMUP_LANGUAGES:
+        return True
+    return _warm_up_finished.is_set()
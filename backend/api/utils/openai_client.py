@@ -0,0 +1,136 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+# Async clients are bound to the event loop they were created in.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+}
+
+
+def _trace(event_name: str, info: Dict):
+    """
+    httpcore trace callback, counting the requests sent to OpenAI and the
+    connections opened for them. Requests sent on a kept-alive connection
+    do not open one.
+    """
+    if event_name == "connection.connect_tcp.complete":
+        with _stats_lock:
+            _stats["new_connections"] += 1
+    elif event_name.endswith(".send_request_headers.started"):
+        with _stats_lock:
+            _stats["requests"] += 1
+
+
+async def _atrace(event_name: str, info: Dict):
+    _trace(event_name, info)
+
+
+def _add_trace(request: httpx.Request):
+    request.extensions["trace"] = _trace
+
+
+async def _add_atrace(request: httpx.Request):
+    request.extensions["trace"] = _atrace
+
+
+def _get_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _get_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.OPENAI_TIMEOUT,
+        connect=settings.OPENAI_CONNECT_TIMEOUT
+    )
+
+
+def get_openai_client() -> OpenAI:
+    """
+    Return the OpenAI client of this process, creating it on first use.
+
+    The client is shared by all threads, so that its pool of connections
+    to OpenAI is kept alive and reused across requests instead of paying
+    a TCP and TLS handshake per call. Timeouts and retries are set in
+    settings (OPENAI_*).
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                limits=_get_limits(),
+                timeout=_get_timeout(),
+                event_hooks={"request": [_add_trace]},
+            )
+            _client = OpenAI(
+                organization=os.environ.get("OPENAI_ORGANIZATION"),
+                api_key=os.environ.get("OPENAI_API_KEY"),
+                http_client=http_client,
+                timeout=http_client.timeout,
+                max_retries=settings.OPENAI_MAX_RETRIES,
+            )
+        return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Return the async OpenAI client of the running event loop, creating it
+    on first use. It is configured like get_openai_client() and shares its
+    connection stats.
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=_get_limits(),
+            timeout=_get_timeout(),
+            event_hooks={"request": [_add_atrace]},
+        )
+        client = _async_clients[loop] = AsyncOpenAI(
+            organization=os.environ.get("OPENAI_ORGANIZATION"),
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=http_client,
+            timeout=http_client.timeout,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+        )
+    return client
+
+
+def get_openai_connection_stats() -> Dict[str, float]:
+    """
+    Return the number of requests sent to OpenAI by this process, of
+    connections opened for them and the share of requests which reused a
+    connection.
+    """
+    with _stats_lock:
+        requests = _stats["requests"]
+        new_connections = _stats["new_connections"]
+
+    reused_connections = max(requests - new_connections, 0)
+    return {
+        "requests": requests,
+        "new_connections": new_connections,
+        "reused_connections": reused_connections,
+        "reuse_ratio": reused_connections / requests if requests else 0,
+    }
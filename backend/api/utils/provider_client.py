@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class BoundedRetry(Retry):
+    """
+    Retry waiting at most settings.PROVIDER_HTTP_TIMEOUT seconds for the
+    Retry-After of a throttled answer, which urllib3 otherwise honours up
+    to hours.
+    """
+
+    def parse_retry_after(self, retry_after: str) -> float:
+        return min(
+            super().parse_retry_after(retry_after),
+            settings.PROVIDER_HTTP_TIMEOUT
+        )
+
+
+def get_provider_session() -> requests.Session:
+    """
+    Return the HTTP session of this process for the translation providers,
+    creating it on first use.
+
+    The session is shared by all threads, so that connections to Microsoft
+    and Yandex are kept alive and reused across requests. Requests failing
+    with connection errors, 429 or 5xx are retried with an exponential
+    backoff (settings PROVIDER_HTTP_*), or after their Retry-After, if it
+    is shorter than PROVIDER_HTTP_TIMEOUT.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = BoundedRetry(
+                total=settings.PROVIDER_HTTP_MAX_RETRIES,
+                backoff_factor=settings.PROVIDER_HTTP_BACKOFF,
+                status_forcelist=[429, 500, 502, 503, 504],
+                # Translation requests are lookups, safe to send again.
+                allowed_methods=["GET", "POST"],
+                respect_retry_after_header=True,
+                # The last answer is returned, for the caller to handle.
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=settings.PROVIDER_HTTP_MAX_CONNECTIONS,
+                pool_maxsize=settings.PROVIDER_HTTP_MAX_CONNECTIONS,
+                max_retries=retry,
+            )
+
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def provider_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send a request to a translation provider on the shared session, with
+    the timeouts of settings, and log how long it took.
+
+    A fresh X-ClientTraceId header is sent with each request, and logged,
+    so that slow requests can be found in the logs of the provider.
+
+    Raises
+    ------
+    Exception
+        If the provider did not answer, even after retries.
+    """
+    trace_id = str(uuid.uuid4())
+    headers = {**kwargs.pop("headers", {}), "X-ClientTraceId": trace_id}
+    start = time.monotonic()
+
+    try:
+        response = get_provider_session().request(
+            method,
+            url,
+            headers=headers,
+            timeout=(
+                settings.PROVIDER_HTTP_CONNECT_TIMEOUT,
+                settings.PROVIDER_HTTP_TIMEOUT
+            ),
+            **kwargs
+        )
+    except requests.RequestException as e:
+        # Not the exception itself, whose URL may hold an API key.
+        logger.warning(
+            "%s %s failed after %.0f ms (trace id %s): %s",
+            method,
+            url,
+            (time.monotonic() - start) * 1000,
+            trace_id,
+            type(e).__name__
+        )
+        raise Exception(
+            "The translation service did not answer. Please, retry in a few seconds."
+        )
+
+    logger.info(
+        "%s %s answered %s in %.0f ms (trace id %s)",
+        method,
+        url,
+        response.status_code,
+        (time.monotonic() - start) * 1000,
+        trace_id
+    )
+    return response
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Result of a call whose first caller was interrupted, for instance
+# cancelled, before it finished.
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one: the first caller
+    runs the function, the others wait for its result, or exception,
+    instead of running it again.
+
+    If the first caller is interrupted, for instance cancelled or stopped
+    by KeyboardInterrupt, the interruption is not raised to the others: one
+    of them runs the function instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        while True:
+            future, is_leader = self._join(key)
+
+            if not is_leader:
+                result = future.result()
+                if result is _ABANDONED:
+                    continue
+                return result
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._leave(key)
+                future.set_exception(e)
+                raise
+            except BaseException:
+                self._leave(key)
+                future.set_result(_ABANDONED)
+                raise
+            else:
+                self._leave(key)
+                future.set_result(result)
+                return result
+
+    async def ado(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Async version of do, for coroutine functions. Waiting for the first
+        caller does not block the event loop, and calls of do and ado with
+        the same key are collapsed together.
+        """
+        while True:
+            future, is_leader = self._join(key)
+
+            if not is_leader:
+                # Shielded, so that cancelling this caller does not cancel
+                # the future the others are waiting on.
+                result = await asyncio.shield(asyncio.wrap_future(future))
+                if result is _ABANDONED:
+                    continue
+                return result
+
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                self._leave(key)
+                future.set_exception(e)
+                raise
+            except BaseException:
+                self._leave(key)
+                future.set_result(_ABANDONED)
+                raise
+            else:
+                self._leave(key)
+                future.set_result(result)
+                return result
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Return the future of the call in flight for `key`, and whether the
+        caller is the first one, which has to run the function.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _leave(self, key: Hashable):
+        # Forgotten before the result is set, so that callers retrying
+        # after an interruption do not find the same call again.
+        with self._lock:
+            del self._calls[key]
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+
+def _wake_up(waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]):
+    for loop, event in waiters:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # The loop of a disconnected client has been closed.
+            pass
+
+
+class GenerationStream:
+    """
+    Chunks of a text being generated, published by the generation thread
+    and read by any number of event loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks: List[str] = []
+        self._finished = False
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def publish(self, chunk: str):
+        with self._lock:
+            self._chunks.append(chunk)
+            waiters = list(self._waiters)
+        _wake_up(waiters)
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+            waiters = list(self._waiters)
+        _wake_up(waiters)
+
+    async def listen(self, timeout: float) -> AsyncIterator[Optional[str]]:
+        """
+        Yield the chunks published so far, then the next ones as soon as
+        they are published, until the stream is finished.
+
+        Yields None after `timeout` seconds without chunks, so that the
+        caller can send keep-alives.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        cursor = 0
+
+        with self._lock:
+            self._waiters.append((loop, event))
+
+        try:
+            while True:
+                event.clear()
+                with self._lock:
+                    chunks = self._chunks[cursor:]
+                    finished = self._finished
+
+                for chunk in chunks:
+                    yield chunk
+                cursor += len(chunks)
+
+                if finished:
+                    return
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+
+        finally:
+            with self._lock:
+                self._waiters.remove((loop, event))
+
+
+_streams: Dict[int, GenerationStream] = {}
+_streams_lock = threading.Lock()
+
+
+def open_generation_stream(text_id: int) -> GenerationStream:
+    with _streams_lock:
+        stream = _streams[text_id] = GenerationStream()
+    return stream
+
+
+def get_generation_stream(text_id: int) -> Optional[GenerationStream]:
+    with _streams_lock:
+        return _streams.get(text_id)
+
+
+def close_generation_stream(text_id: int):
+    """
+    Finish the stream of a text, once it is saved, and forget it. Clients
+    still listening to it read the end of the text and stop.
+    """
+    with _streams_lock:
+        stream = _streams.pop(text_id, None)
+    if stream is not None:
+        stream.finish()
+
+
+_finished_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+
+def notify_text_finished():
+    """
+    Wake up the requests of this process waiting for texts to finish
+    generation (see wait_for_finished_texts).
+    """
+    with _streams_lock:
+        waiters = list(_finished_waiters)
+    _wake_up(waiters)
+
+
+async def wait_for_finished_texts(timeout: float):
+    """
+    Wait until a text of this process finishes generation, or `timeout`
+    seconds.
+    """
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+
+    with _streams_lock:
+        _finished_waiters.append((loop, event))
+
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        with _streams_lock:
+            _finished_waiters.remove((loop, event))
@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from api.models import Language, PooledText
+from api.utils import get_generation_prompt
+from api.utils.generation import GenerationBusy, get_generation_executor
+from api.utils.generation_plan import (
+    finish_completion,
+    plan_generation,
+    record_generation
+)
+from api.utils.openai_client import get_openai_client
+from api.utils.tokenization import tokenize_text
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[int, str, str]
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "generated": 0,
+}
+
+_refills_lock = threading.Lock()
+_refills: Set[PoolKey] = set()
+_last_generation = 0.0
+
+
+def is_pooled(language: Optional[Language], level: str, length: str) -> bool:
+    """
+    Whether texts about a random subject are generated in advance for this
+    language, level and length.
+    """
+    return bool(
+        settings.TEXT_POOL_SIZE
+        and language is not None
+        and (not settings.TEXT_POOL_LANGUAGES
+             or language.code in settings.TEXT_POOL_LANGUAGES)
+        and level in settings.TEXT_POOL_LEVELS
+        and length in settings.TEXT_POOL_LENGTHS
+    )
+
+
+def take_pooled_text(language: Language, level: str, length: str) -> Optional[PooledText]:
+    """
+    Remove the oldest text of the pool for this language, level and length
+    and return it, or None if the pool is empty. A refill of the pool is
+    scheduled either way.
+    """
+    with transaction.atomic():
+        pooled_text = (
+            PooledText
+            .objects
+            .select_for_update(skip_locked=True)
+            .filter(language=language, level=level, length=length)
+            .order_by("created_at")
+            .first()
+        )
+        if pooled_text is not None:
+            pooled_text.delete()
+
+    with _stats_lock:
+        _stats["hits" if pooled_text is not None else "misses"] += 1
+
+    schedule_refill(language, level, length)
+    return pooled_text
+
+
+def schedule_refill(language: Language, level: str, length: str):
+    """
+    Refill the pool for this language, level and length on the generation
+    executor, unless a refill is already scheduled, the executor is busy
+    with texts users are waiting for, or background refills are disabled
+    (settings.TEXT_POOL_REFILL_RATE <= 0).
+    """
+    if settings.TEXT_POOL_REFILL_RATE <= 0:
+        return
+
+    key = (language.pk, level, length)
+
+    with _refills_lock:
+        if key in _refills:
+            return
+        _refills.add(key)
+
+    _submit_refill(key)
+
+
+def _submit_refill(key: PoolKey):
+    try:
+        get_generation_executor().submit(
+            refill_text_pool, *key, wait=False)
+    except GenerationBusy:
+        with _refills_lock:
+            _refills.discard(key)
+
+
+def _reschedule_refill(key: PoolKey, delay: float):
+    timer = threading.Timer(delay, _submit_refill, args=(key,))
+    timer.daemon = True
+    timer.start()
+
+
+def refill_text_pool(language_id: int, level: str, length: str, wait: bool = True) -> int:
+    """
+    Generate texts until the pool for this language, level and length holds
+    settings.TEXT_POOL_SIZE texts, at most settings.TEXT_POOL_REFILL_RATE
+    texts per minute per process, or without a limit if it is 0.
+
+    Parameters
+    ----------
+    wait : bool
+        Whether to wait for the rate limit to allow the next text. Refills
+        scheduled in the background do not hold a generation worker while
+        waiting: they are submitted again once the next text is allowed.
+
+    Returns
+    -------
+    generated : int
+        The number of texts generated.
+    """
+    key = (language_id, level, length)
+    generated = 0
+    rescheduled = False
+
+    try:
+        language = Language.objects.get(pk=language_id)
+        texts = PooledText.objects.filter(
+            language=language, level=level, length=length)
+
+        while texts.count() < settings.TEXT_POOL_SIZE:
+            delay = _acquire_generation()
+            if delay and wait:
+                time.sleep(delay)
+            elif delay:
+                _reschedule_refill(key, delay)
+                rescheduled = True
+                break
+            else:
+                generate_pooled_text(language, level, length)
+                generated += 1
+
+    finally:
+        if not rescheduled:
+            with _refills_lock:
+                _refills.discard(key)
+
+    return generated
+
+
+def _acquire_generation() -> float:
+    """
+    Rate limit of the generation of pooled texts: one every
+    60 / settings.TEXT_POOL_REFILL_RATE seconds, none if it is 0.
+
+    Returns
+    -------
+    delay : float
+        0 if a text can be generated now, which counts as the last
+        generation, else the seconds until the next one can.
+    """
+    global _last_generation
+
+    if settings.TEXT_POOL_REFILL_RATE <= 0:
+        return 0
+
+    with _refills_lock:
+        now = time.monotonic()
+        delay = _last_generation + 60 / settings.TEXT_POOL_REFILL_RATE - now
+        if delay > 0:
+            return delay
+        _last_generation = now
+        return 0
+
+
+def generate_pooled_text(language: Language, level: str, length: str) -> PooledText:
+    prompt = get_generation_prompt(language.name, "", level, length, [])
+    plan = plan_generation("pooled", language.code, level, length)
+    start = time.monotonic()
+
+    result = get_openai_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": prompt}
+        ],
+        max_tokens=plan.max_tokens,
+        timeout=plan.timeout,
+    )
+
+    choice = result.choices[0]
+    generatedText = finish_completion(
+        plan, choice.message.content or "", choice.finish_reason)
+    record_generation(
+        plan,
+        generatedText,
+        choice.finish_reason,
+        time.monotonic() - start,
+        result.usage.completion_tokens if result.usage else None
+    )
+
+    text, tokens = tokenize_text(generatedText, language.code)
+
+    pooled_text = PooledText.objects.create(
+        language=language,
+        level=level,
+        length=length,
+        text=text,
+        tokens=tokens,
+    )
+
+    with _stats_lock:
+        _stats["generated"] += 1
+    logger.info(
+        "Generated a pooled text in %s (%s, %s words)",
+        language.code, level, length
+    )
+
+    return pooled_text
+
+
+def fill_text_pool() -> int:
+    """
+    Refill the pools of all pooled languages, levels and lengths.
+
+    Returns
+    -------
+    generated : int
+        The number of texts generated.
+    """
+    languages = Language.objects.all()
+    if settings.TEXT_POOL_LANGUAGES:
+        languages = languages.filter(code__in=settings.TEXT_POOL_LANGUAGES)
+
+    generated = 0
+    for language in languages:
+        for level in settings.TEXT_POOL_LEVELS:
+            for length in settings.TEXT_POOL_LENGTHS:
+                generated += refill_text_pool(language.pk, level, length)
+
+    return generated
+
+
+def get_text_pool_stats() -> Dict:
+    """
+    Return the number of texts in each pool, and the number of pooled texts
+    served, missed and generated by this process.
+    """
+    sizes = []
+    if settings.TEXT_POOL_SIZE:
+        sizes = (
+            PooledText
+            .objects
+            .values("language__code", "level", "length")
+            .annotate(count=Count("pk"))
+        )
+
+    with _stats_lock:
+        stats = dict(_stats)
+
+    return {
+        "size": settings.TEXT_POOL_SIZE,
+        "refill_rate": settings.TEXT_POOL_REFILL_RATE,
+        "pools": {
+            f"{size['language__code']}:{size['level']}:{size['length']}": size["count"]
+            for size in sizes
+        },
+        **stats,
+    }
@@ -0,0 +1,349 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import django
+import spacy
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from api.utils.nlp import (
+    build_tokens,
+    get_model_from_language,
+    get_pipeline_profile,
+    merge_tokens,
+    split_text_with_spacy,
+    split_texts_with_spacy
+)
+
+logger = logging.getLogger(__name__)
+
+# Version of the structure of the tokens (see api.utils.nlp.build_tokens),
+# part of the cache keys.
+TOKENS_VERSION = 1
+
+TokenizedText = Tuple[str, Dict[str, Any]]
+
+# A tokenized text, and whether it was split without the model of its
+# language because the model could not be loaded. Such results are not
+# cached, so that the text is tokenized again once the model is back.
+Tokenization = Tuple[str, Dict[str, Any], bool]
+
+# Boundaries long texts are split at, from the preferred to the last resort:
+# after a line break, after the end of a sentence, before a word.
+CHUNK_BOUNDARIES = [
+    re.compile(r'(?<=\n)(?=[^\n])'),
+    re.compile(r'(?<=[.!?。！？]\s)'),
+    re.compile(r'(?<=\s)(?=\S)'),
+]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize line endings and unicode composition, so that the same text
+    pasted or OCRed twice is tokenized, and cached, the same way.
+    """
+    return unicodedata.normalize("NFC", text.replace("\r\n", "\n"))
+
+
+def get_cache_key(text: str, language_code: Optional[str]) -> str:
+    """
+    Return the tokenization cache key of a normalized text. The key depends
+    on everything the result depends on: the text, the model, its pipeline
+    profile and the spaCy version.
+    """
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    return ":".join([
+        "tokenization",
+        str(TOKENS_VERSION),
+        spacy.__version__,
+        get_model_from_language(language_code) or "none",
+        get_pipeline_profile(language_code),
+        digest,
+    ])
+
+
+def get_tokenization_cache():
+    return caches["tokenization"]
+
+
+def tokenize(text: str, language_code: Optional[str]) -> Tokenization:
+    """
+    Split `text` into tokens with the spaCy model of the language.
+
+    Returns
+    -------
+    text, tokens, fallback : Tuple[str, Dict, bool]
+        The text, its tokens (see api.utils.nlp.build_tokens) and whether
+        they were split without the model because it could not be loaded.
+    """
+    model = get_model_from_language(language_code)
+    tokens, fallback = split_text_with_spacy(
+        text, model, get_pipeline_profile(language_code))
+    return text, tokens, fallback
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the process pool used for tokenization, creating it on first use.
+    Returns None when settings.TOKENIZATION_WORKERS is 0, in which case texts
+    are tokenized in the calling thread.
+
+    Notes
+    -----
+    Workers are spawned rather than forked, because the pool is created from
+    a request thread of a multi-threaded process. Each worker runs
+    django.setup() before its first task, and only loads the model of a
+    language when it first tokenizes a text in it, within the budget of
+    settings.SPACY_MODEL_CACHE_*.
+    """
+    global _executor
+
+    if not settings.TOKENIZATION_WORKERS:
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.TOKENIZATION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def _restart_executor():
+    global _executor
+
+    logger.exception("Tokenization pool is broken, restarting it")
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def submit_tokenization(text: str, language_code: Optional[str]) -> Optional[Future]:
+    executor = get_executor()
+    if executor is None:
+        return None
+
+    try:
+        return executor.submit(tokenize, text, language_code)
+    except BrokenProcessPool:
+        _restart_executor()
+        return None
+
+
+def tokenize_text(text: str, language_code: Optional[str]) -> TokenizedText:
+    """
+    Tokenize `text` in the tokenization pool and wait for the result.
+
+    The calling thread only waits on the result, so it does not hold the GIL
+    while spaCy parses the text. Falls back to tokenizing in the calling
+    thread when the pool is disabled or broken.
+
+    Results are cached by content hash, so tokenizing the same text again
+    is almost free. Texts split without their model, because it could not
+    be loaded, are not cached.
+
+    Returns
+    -------
+    text, tokens : Tuple[str, Dict]
+        The normalized text, which is the one to save, and its tokens.
+    """
+    text = normalize_text(text)
+    cache = get_tokenization_cache()
+    key = get_cache_key(text, language_code)
+
+    result = cache.get(key)
+    if result is None:
+        text, tokens, fallback = _tokenize_text(text, language_code)
+        result = (text, tokens)
+        if not fallback:
+            cache.set(key, result)
+
+    return tuple(result)
+
+
+def _tokenize_text(text: str, language_code: Optional[str]) -> Tokenization:
+    future = submit_tokenization(text, language_code)
+    if future is None:
+        return tokenize(text, language_code)
+
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        _restart_executor()
+        return tokenize(text, language_code)
+
+
+async def atokenize_text(text: str, language_code: Optional[str]) -> TokenizedText:
+    """
+    Async version of tokenize_text, which does not block the event loop.
+    """
+    text = normalize_text(text)
+    cache = get_tokenization_cache()
+    key = get_cache_key(text, language_code)
+
+    result = await cache.aget(key)
+    if result is None:
+        text, tokens, fallback = await _atokenize_text(text, language_code)
+        result = (text, tokens)
+        if not fallback:
+            await cache.aset(key, result)
+
+    return tuple(result)
+
+
+async def _atokenize_text(text: str, language_code: Optional[str]) -> Tokenization:
+    future = submit_tokenization(text, language_code)
+    if future is None:
+        return await sync_to_async(tokenize, thread_sensitive=False)(
+            text, language_code)
+
+    try:
+        return await asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        _restart_executor()
+        return await sync_to_async(tokenize, thread_sensitive=False)(
+            text, language_code)
+
+
+def tokenize_texts(
+        items: List[Tuple[str, Optional[str]]],
+        batch_size: Optional[int] = None,
+        n_process: Optional[int] = None,
+        refresh: bool = False) -> List[TokenizedText]:
+    """
+    Tokenize many texts at once, for bulk ingestion.
+
+    Texts are grouped by language and each group goes through nlp.pipe()
+    in the calling process, which is much faster than one nlp() call per
+    text. Texts found in the tokenization cache are not tokenized again,
+    and texts split without their model, because it could not be loaded,
+    are not cached.
+
+    Parameters
+    ----------
+    items : List[Tuple[str, Optional[str]]]
+        Pairs of (text, language code).
+
+    batch_size : Optional[int]
+        Defaults to settings.TOKENIZATION_BATCH_SIZE.
+
+    n_process : Optional[int]
+        Defaults to settings.TOKENIZATION_N_PROCESS.
+
+    refresh : bool
+        Ignore cached results. The new results are still cached.
+
+    Returns
+    -------
+    results : List[Tuple[str, Dict]]
+        The normalized text and tokens of each item, in the order of
+        `items`.
+    """
+    batch_size = batch_size or settings.TOKENIZATION_BATCH_SIZE
+    n_process = n_process or settings.TOKENIZATION_N_PROCESS
+
+    cache = get_tokenization_cache()
+    texts = [normalize_text(text) for text, _ in items]
+    keys = [
+        get_cache_key(text, language_code)
+        for text, (_, language_code) in zip(texts, items)
+    ]
+    cached = {} if refresh else cache.get_many(keys)
+
+    results: List[TokenizedText] = [("", {})] * len(items)
+    indexes_by_language: Dict[Optional[str], List[int]] = defaultdict(list)
+
+    for idx, (_, language_code) in enumerate(items):
+        if keys[idx] in cached:
+            results[idx] = tuple(cached[keys[idx]])
+        else:
+            indexes_by_language[language_code].append(idx)
+
+    for language_code, indexes in indexes_by_language.items():
+        tokens, fallback = split_texts_with_spacy(
+            [texts[idx] for idx in indexes],
+            get_model_from_language(language_code),
+            get_pipeline_profile(language_code),
+            batch_size=batch_size,
+            n_process=n_process,
+        )
+        for idx, text_tokens in zip(indexes, tokens):
+            results[idx] = (texts[idx], text_tokens)
+
+        if not fallback:
+            cache.set_many({keys[idx]: results[idx] for idx in indexes})
+
+    return results
+
+
+def _split_into_pieces(text: str, max_length: int, level: int = 0) -> Iterator[str]:
+    if len(text) <= max_length:
+        yield text
+        return
+
+    if level == len(CHUNK_BOUNDARIES):
+        for start in range(0, len(text), max_length):
+            yield text[start:start + max_length]
+        return
+
+    for piece in CHUNK_BOUNDARIES[level].split(text):
+        yield from _split_into_pieces(piece, max_length, level + 1)
+
+
+def split_into_chunks(text: str, max_length: int) -> List[str]:
+    """
+    Split `text` into chunks of at most `max_length` characters, at line
+    breaks when possible, then at the end of sentences, then between words.
+    Joining the chunks gives back `text`.
+    """
+    chunks = []
+    chunk = ""
+
+    for piece in _split_into_pieces(text, max_length):
+        if chunk and len(chunk) + len(piece) > max_length:
+            chunks.append(chunk)
+            chunk = ""
+        chunk += piece
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def tokenize_text_in_chunks(text: str, language_code: Optional[str]) -> Iterator[TokenizedText]:
+    """
+    Tokenize a long text chunk by chunk (see split_into_chunks).
+
+    Yields
+    ------
+    text, tokens : Tuple[str, Dict]
+        The part of the normalized text tokenized so far and its tokens,
+        after each chunk.
+    """
+    text = normalize_text(text)
+    tokenized_text = ""
+    tokens = build_tokens([], [], [])
+
+    for chunk in split_into_chunks(text, settings.TOKENIZATION_CHUNK_LENGTH):
+        chunk, chunk_tokens = tokenize_text(chunk, language_code)
+        tokens = merge_tokens(tokens, chunk_tokens, len(tokenized_text))
+        tokenized_text += chunk
+
+        yield tokenized_text, tokens
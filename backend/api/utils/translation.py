@@ -1,20 +1,24 @@
 import json
-import os
-import uuid
-from typing import List
+from functools import partial
+from typing import Dict, List, Tuple
 
-import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from openai import OpenAI
 
 from api.models import Example, Language, Translation, Word
+from api.utils.micro_batch import MicroBatcher
+from api.utils.openai_client import (
+    get_async_openai_client,
+    get_openai_client
+)
+from api.utils.provider_client import provider_request
+from api.utils.translation_cache import invalidate_translation
 
 ENDPOINT = "https://api.cognitive.microsofttranslator.com"
 HEADERS = {
     'Ocp-Apim-Subscription-Key': settings.MICROSOFT_TRANSLATION_API_KEY,
     'Ocp-Apim-Subscription-Region': "northeurope",
     'Content-type': 'application/json',
-    'X-ClientTraceId': str(uuid.uuid4())
 }
 
 
@@ -44,26 +48,72 @@ def get_chatgpt_translation(word, language_from: Language, language_to: Language
     Exception
         If ChatGPT fails to provide a translation for the given word.
     """
-    prompt = f"""Translate the {language_from.name} word [[{word}]] in {language_to.name}.
-There can be several translations but a maximum of 3. Each translation should have an example.
-Your output must consist only of a JSON object where each key is a translation in {language_to.name} without any article,
-and each value is a dictionnary with inside a key \"source\" and a value that is an example in {language_from.name},
-and a key \"target\" and a value that is an example in {language_to.name}."""
+    client = get_openai_client()
 
-    client = OpenAI(
-        organization=os.environ.get("OPENAI_ORGANIZATION"),
-        api_key=os.environ.get("OPENAI_API_KEY")
+    result = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {
+                "role": "system",
+                "content": get_chatgpt_translation_prompt(
+                    word, language_from, language_to)
+            }
+        ],
+        max_tokens=2048,
     )
 
-    result = client.chat.completions.create(
+    return save_chatgpt_translation(
+        result.choices[0].message.content or "",
+        word,
+        language_from,
+        language_to
+    )
+
+
+async def aget_chatgpt_translation(word, language_from: Language, language_to: Language):
+    """
+    Async version of get_chatgpt_translation, which does not block the
+    event loop while ChatGPT answers.
+    """
+    client = get_async_openai_client()
+
+    result = await client.chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[
-            {"role": "system", "content": prompt}
+            {
+                "role": "system",
+                "content": get_chatgpt_translation_prompt(
+                    word, language_from, language_to)
+            }
         ],
         max_tokens=2048,
     )
 
-    answer = result.choices[0].message.content or ""
+    return await sync_to_async(save_chatgpt_translation)(
+        result.choices[0].message.content or "",
+        word,
+        language_from,
+        language_to
+    )
+
+
+def get_chatgpt_translation_prompt(word, language_from: Language, language_to: Language) -> str:
+    return f"""Translate the {language_from.name} word [[{word}]] in {language_to.name}.
+There can be several translations but a maximum of 3. Each translation should have an example.
+Your output must consist only of a JSON object where each key is a translation in {language_to.name} without any article,
+and each value is a dictionnary with inside a key \"source\" and a value that is an example in {language_from.name},
+and a key \"target\" and a value that is an example in {language_to.name}."""
+
+
+def save_chatgpt_translation(answer: str, word, language_from: Language, language_to: Language):
+    """
+    Save the translations of `word` in ChatGPT's `answer`.
+
+    Raises
+    ------
+    Exception
+        If the answer is not the JSON object asked for.
+    """
     translations = []
 
     try:
@@ -121,6 +171,8 @@ and a key \"target\" and a value that is an example in {language_to.name}."""
 
                 examples = Example.objects.bulk_create(examples)
                 translation.refresh_from_db()
+                # bulk_create sends no post_save signal.
+                invalidate_translation(translation)
 
             translations.append(translation)
         return translations
@@ -168,13 +220,15 @@ def get_yandex_translation(word, language_from: Language, language_to: Language)
     if is_a_group_of_word:
         pass
     else:
-        url = (
-            f"https://dictionary.yandex.net/api/v1/dicservice.json/lookup?"
-            f"key={settings.YANDEX_DICTIONNARY_API_KEY}&"
-            f"lang={language_from.code}-{language_to.code}&"
-            f"text={word}"
+        request = provider_request(
+            "GET",
+            "https://dictionary.yandex.net/api/v1/dicservice.json/lookup",
+            params={
+                "key": settings.YANDEX_DICTIONNARY_API_KEY,
+                "lang": f"{language_from.code}-{language_to.code}",
+                "text": word,
+            }
         )
-        request = requests.get(url)
         result = request.json()
 
         if request.status_code == 200:
@@ -237,6 +291,8 @@ def get_yandex_translation(word, language_from: Language, language_to: Language)
 
                             examples = Example.objects.bulk_create(examples)
                             translation.refresh_from_db()
+                            # bulk_create sends no post_save signal.
+                            invalidate_translation(translation)
 
                         translations.append(translation)
             return translations
@@ -368,7 +424,8 @@ def make_translate_request(word, language_from: Language, language_to: Language)
         'to': language_to.code
     }
 
-    request = requests.post(
+    request = provider_request(
+        "POST",
         constructed_url,
         params=params,
         headers=HEADERS,
@@ -472,27 +529,79 @@ def make_dictionnary_lookup_request(word, language_from: Language, language_to:
     -----
     This function constructs and sends an HTTP POST request to the Microsoft Translator API to look up the given word in the dictionary.
     The API version used is '3.0'.
+    Lookups in the same languages made at the same time are sent in one request, see send_dictionnary_request.
     """
-    path = '/dictionary/lookup'
-    constructed_url = ENDPOINT + path
+    return dictionnary_lookup_batcher.submit(
+        (language_from.code, language_to.code),
+        {'text': word}
+    )
 
-    body = [{
-        'text': word
-    }]
 
-    params = {
-        'api-version': '3.0',
-        'from': language_from.code,
-        'to': language_to.code
-    }
+def send_dictionnary_request(path: str, languages: Tuple[str, str], body: List[Dict]) -> List:
+    """
+    Send the items of `body`, batched by a MicroBatcher, to a dictionary
+    endpoint of the Microsoft Translator API in one request.
 
-    request = requests.post(
-        constructed_url,
-        params=params,
+    Parameters
+    ----------
+    path : str
+        '/dictionary/lookup' or '/dictionary/examples'.
+
+    languages : Tuple[str, str]
+        The codes of the source and target languages of all the items.
+
+    body : List[Dict]
+        The items, at most 10.
+
+    Returns
+    -------
+    results : List
+        For each item, its answer in a list, like the answer to a request
+        for this item alone, or the error Microsoft answered with. A batch
+        rejected with a 400xxx error, which may be caused by a single item,
+        is sent again item by item, so that this item does not fail the
+        others. Other errors, like an invalid key, throttling or an outage,
+        are returned for every item.
+    """
+    language_from, language_to = languages
+
+    request = provider_request(
+        "POST",
+        ENDPOINT + path,
+        params={
+            'api-version': '3.0',
+            'from': language_from,
+            'to': language_to
+        },
         headers=HEADERS,
         json=body
     )
-    return request.json()
+    result = request.json()
+
+    if isinstance(result, list):
+        return [[item_result] for item_result in result]
+
+    error_code = result.get("error", {}).get("code", 0)
+    if len(body) > 1 and error_code // 1000 == 400:
+        return [
+            send_dictionnary_request(path, languages, [item])[0]
+            for item in body
+        ]
+
+    return [result for _ in body]
+
+
+dictionnary_lookup_batcher = MicroBatcher(
+    partial(send_dictionnary_request, '/dictionary/lookup'),
+    settings.MICROSOFT_BATCH_WINDOW_MS / 1000,
+    settings.MICROSOFT_BATCH_MAX_ITEMS
+)
+
+dictionnary_examples_batcher = MicroBatcher(
+    partial(send_dictionnary_request, '/dictionary/examples'),
+    settings.MICROSOFT_BATCH_WINDOW_MS / 1000,
+    settings.MICROSOFT_BATCH_MAX_ITEMS
+)
 
 
 def get_dictionnary_lookup(json, language_from: Language, language_to: Language):
@@ -592,16 +701,9 @@ def make_dictionnary_examples_request(translations: List[Translation], language_
     This function constructs and sends an HTTP POST request to the Microsoft Translator API to retrieve dictionary examples
     for the given translations.
     The API version used is '3.0'.
+    Examples in the same languages asked at the same time are retrieved in one request, see send_dictionnary_request.
     """
-    path = '/dictionary/examples'
-    constructed_url = ENDPOINT + path
-
     body = []
-    params = {
-        'api-version': '3.0',
-        'from': language_from.code,
-        'to': language_to.code
-    }
 
     for translation in translations:
         body.append({
@@ -610,9 +712,13 @@ def make_dictionnary_examples_request(translations: List[Translation], language_
         })
 
     if body:
-        request = requests.post(
-            constructed_url, params=params, headers=HEADERS, json=body)
-        return request.json()
+        results = dictionnary_examples_batcher.submit_many(
+            (language_from.code, language_to.code), body)
+
+        for result in results:
+            if "error" in result:
+                return result
+        return [result[0] for result in results]
 
     return {}
 
@@ -661,5 +767,7 @@ def get_dictionnary_examples(json, translations: List[Translation]) -> List[Exam
 
                 examples = Example.objects.bulk_create(examples)
                 translation.refresh_from_db()
+                # bulk_create sends no post_save signal.
+                invalidate_translation(translation)
 
     return examples
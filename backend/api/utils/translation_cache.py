@@ -0,0 +1,236 @@
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+
+from api.models import Language, Translation
+from api.utils.single_flight import SingleFlight
+
+
+class LRUCache:
+    """
+    Thread-safe cache of at most `max_entries` values, each kept `timeout`
+    seconds unless set with another timeout. The least recently used values
+    are evicted first.
+    """
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = self.timeout
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Concurrent lookups of the same translations in this process.
+translation_flight = SingleFlight()
+
+_local_cache = LRUCache(
+    settings.TRANSLATION_CACHE_LOCAL_MAX_ENTRIES,
+    settings.TRANSLATION_CACHE_LOCAL_TIMEOUT
+)
+
+
+def get_translation_cache():
+    return caches["translations"]
+
+
+def get_translation_cache_key(word: str, language_from_id: int, language_to_id: int, provider: str) -> str:
+    digest = hashlib.sha256(word.encode()).hexdigest()
+    return f"translation:{provider}:{language_from_id}:{language_to_id}:{digest}"
+
+
+def get_cached_translations(word: str, language_from: Language, language_to: Language, provider: str) -> Optional[Dict]:
+    """
+    Return the serialized translations of the word, from the cache of this
+    process or else from the shared cache, or None if neither has them.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+
+    data = _local_cache.get(key)
+    if data is None:
+        data = get_translation_cache().get(key)
+        if data is None:
+            return None
+        _local_cache.set(key, data)
+
+    return copy.deepcopy(data)
+
+
+async def aget_cached_translations(word: str, language_from: Language, language_to: Language, provider: str) -> Optional[Dict]:
+    """
+    Async version of get_cached_translations.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+
+    data = _local_cache.get(key)
+    if data is None:
+        data = await get_translation_cache().aget(key)
+        if data is None:
+            return None
+        _local_cache.set(key, data)
+
+    return copy.deepcopy(data)
+
+
+def cache_translations(word: str, language_from: Language, language_to: Language, provider: str, data: Dict):
+    """
+    Store the serialized translations of the word (see
+    api.views.serialize_translations) in both caches.
+
+    Words the provider has no translation for, like proper nouns and typos,
+    are only kept settings.TRANSLATION_NEGATIVE_CACHE_TIMEOUT seconds, after
+    which the provider is asked again.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+
+    data = copy.deepcopy(data)
+
+    if data["translations"]:
+        _local_cache.set(key, data)
+        get_translation_cache().set(key, data)
+    else:
+        timeout = settings.TRANSLATION_NEGATIVE_CACHE_TIMEOUT
+        _local_cache.set(key, data, min(timeout, _local_cache.timeout))
+        get_translation_cache().set(key, data, timeout)
+
+
+def invalidate_translation(translation: Translation):
+    """
+    Forget the cached translations of the source word of `translation`, once
+    it or its examples changed. The caches of other processes keep them up
+    to settings.TRANSLATION_CACHE_LOCAL_TIMEOUT seconds.
+    """
+    try:
+        word_source = translation.word_source
+        word_target = translation.word_target
+    except ObjectDoesNotExist:
+        # The translation is being deleted along with its words.
+        return
+
+    if word_source.language_id is None or word_target.language_id is None:
+        return
+
+    key = get_translation_cache_key(
+        word_source.word,
+        word_source.language_id,
+        word_target.language_id,
+        translation.provider
+    )
+    _local_cache.delete(key)
+    get_translation_cache().delete(key)
+
+
+def lock_translations(word: str, language_from: Language, language_to: Language, provider: str) -> bool:
+    """
+    Try to become the process looking up the translations of the word, for
+    at most settings.TRANSLATION_LOCK_TIMEOUT seconds.
+
+    The lock is only exclusive with a shared cache backend whose add() is
+    atomic, like Redis or Memcached. The default file-based cache narrows
+    the race without closing it.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+    return get_translation_cache().add(
+        f"{key}:lock", 1, settings.TRANSLATION_LOCK_TIMEOUT)
+
+
+def unlock_translations(word: str, language_from: Language, language_to: Language, provider: str):
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+    get_translation_cache().delete(f"{key}:lock")
+
+
+def wait_for_translations(word: str, language_from: Language, language_to: Language, provider: str) -> Optional[Dict]:
+    """
+    Wait for the process holding the lock of the word to cache its
+    translations, and return them. Returns None if the lock is released or
+    expires without them.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+    cache = get_translation_cache()
+    deadline = time.monotonic() + settings.TRANSLATION_LOCK_TIMEOUT
+
+    while time.monotonic() < deadline:
+        time.sleep(settings.TRANSLATION_LOCK_POLL_INTERVAL)
+
+        data = cache.get(key)
+        if data is not None:
+            _local_cache.set(key, data)
+            return copy.deepcopy(data)
+
+        if f"{key}:lock" not in cache:
+            break
+
+    return None
+
+
+async def await_translations(word: str, language_from: Language, language_to: Language, provider: str) -> Optional[Dict]:
+    """
+    Async version of wait_for_translations.
+    """
+    key = get_translation_cache_key(
+        word, language_from.pk, language_to.pk, provider)
+    cache = get_translation_cache()
+    deadline = time.monotonic() + settings.TRANSLATION_LOCK_TIMEOUT
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.TRANSLATION_LOCK_POLL_INTERVAL)
+
+        data = await cache.aget(key)
+        if data is not None:
+            _local_cache.set(key, data)
+            return copy.deepcopy(data)
+
+        if not await cache.ahas_key(f"{key}:lock"):
+            break
+
+    return None
+
+
+def clear_translation_cache():
+    _local_cache.clear()
+    get_translation_cache().clear()
@@ -0,0 +1,23 @@
+import asyncio
+import weakref
+
+from google.cloud import vision
+
+# Async clients are bound to the event loop they were created in.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, vision.ImageAnnotatorAsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_vision_client() -> vision.ImageAnnotatorAsyncClient:
+    """
+    Return the async Google Vision client of the running event loop,
+    creating it on first use, so that its credentials and gRPC channel are
+    reused across requests instead of being set up for each picture.
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = vision.ImageAnnotatorAsyncClient()
+    return client
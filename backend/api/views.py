@@ -1,22 +1,31 @@
+import asyncio
+import math
 import re
-import threading
+import time
 from smtplib import SMTPException
-from typing import Any
+from typing import Any, Dict, List, Optional, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models import Prefetch, Q
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
 from google.cloud import vision
 from rest_framework import mixins, status, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    action,
+    api_view,
+    authentication_classes,
+    permission_classes
+)
 from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from api.models import (
     CustomUserModel,
-    Example,
     Language,
     Text,
     Translation,
@@ -27,25 +36,62 @@ from api.permissions import (
     UserPermission,
     UserTranslationPermission
 )
+from api.renderers import EventStreamRenderer, format_event
 from api.serializers import (
     ContactFormSerializer,
     CustomUserModelSerializer,
     ExampleSerializer,
     LanguageModelSerializer,
+    TextBatchSerializer,
     TextSerializer,
     TranslationSerializer,
     UserTranslationSerializer
 )
 from api.utils import (
     ask_gpt_to_generate_a_text,
-    get_model_from_language,
-    split_text_with_spacy
+    ask_gpt_to_generate_texts,
+    tokenize_text_object_in_chunks
+)
+from api.utils.asynchronous import (
+    async_api_view,
+    parse_json,
+    render_json
+)
+from api.utils.generation import (
+    GenerationBusy,
+    enqueue_job,
+    get_generation_executor
+)
+from api.utils.nlp import is_ready, model_registry
+from api.utils.openai_client import get_openai_connection_stats
+from api.utils.streaming import (
+    get_generation_stream,
+    wait_for_finished_texts
+)
+from api.utils.text_pool import (
+    get_text_pool_stats,
+    is_pooled,
+    take_pooled_text
 )
+from api.utils.tokenization import TokenizedText, atokenize_text, tokenize_text
 from api.utils.translation import (
+    aget_chatgpt_translation,
     get_chatgpt_translation,
     get_microsoft_translation,
     get_yandex_translation
 )
+from api.utils.translation_cache import (
+    aget_cached_translations,
+    await_translations,
+    cache_translations,
+    get_cached_translations,
+    get_translation_cache_key,
+    lock_translations,
+    translation_flight,
+    unlock_translations,
+    wait_for_translations
+)
+from api.utils.vision_client import get_async_vision_client
 
 
 @permission_classes([TextPermission])
@@ -69,6 +115,12 @@ class TextViewSet(
 
         try:
             data = self.perform_create(serializer)
+        except GenerationBusy as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(settings.GENERATION_RETRY_AFTER)}
+            )
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -77,57 +129,379 @@ class TextViewSet(
 
     def perform_create(self, serializer):
         request: Any = self.request
-        user: CustomUserModel = request.user
+        return save_text(serializer, request.user)
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Create several texts to generate at once (see TextBatchSerializer).
+        """
+        serializer = TextBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            data = save_texts(serializer, request.user)
+        except GenerationBusy as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(settings.GENERATION_RETRY_AFTER)}
+            )
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        renderer_classes=[
+            EventStreamRenderer,
+            *api_settings.DEFAULT_RENDERER_CLASSES
+        ]
+    )
+    def stream(self, request, pk=None):
+        """
+        Stream a text being generated as Server-Sent Events: "chunk" events
+        with the new part of the text as it is generated, then a "text"
+        event with the saved text and its tokens.
+        """
+        text_object: Text = self.get_object()
+
+        response = StreamingHttpResponse(
+            self.generate_events(text_object.pk),
+            content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def generate_events(self, pk: int):
+        """
+        Forward the chunks of the text if it is being generated, or a long
+        pasted text tokenized, in this process. Otherwise, for instance
+        while the job is waiting for a worker or runs in
+        run_generation_worker, wait for the text to be saved.
+        """
+        deadline = time.monotonic() + settings.GENERATION_STREAM_TIMEOUT
+
+        while time.monotonic() < deadline:
+            stream = get_generation_stream(pk)
+            if stream is not None:
+                async for chunk in stream.listen(settings.GENERATION_STREAM_KEEP_ALIVE):
+                    if chunk is None:
+                        yield ": keep-alive\n\n"
+                    else:
+                        yield format_event("chunk", {"text": chunk})
+                break
+
+            text_object = await Text.objects.filter(pk=pk).afirst()
+            if text_object is None or text_object.has_finished_generation:
+                break
+
+            yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.GENERATION_STREAM_POLL_INTERVAL)
+
+        data = await sync_to_async(self.serialize_text)(pk)
+        if data is not None:
+            yield format_event("text", data)
+
+    def serialize_text(self, pk: int):
+        text_object = (
+            Text
+            .objects
+            .select_related("language")
+            .filter(pk=pk)
+            .first()
+        )
+        if text_object is None:
+            return None
+        return TextSerializer(text_object).data
+
+    @action(detail=False, url_path="status")
+    def generation_status(self, request):
+        """
+        Long-poll the generation of the texts whose ids are in the `pending`
+        query parameter. Answers with the ids of those which have finished
+        generation or been deleted as soon as there are some, or with no
+        ids after `timeout` seconds.
+        """
+        try:
+            pending = [
+                int(pk)
+                for pk in request.query_params.get("pending", "").split(",")
+                if pk
+            ]
+            timeout = float(request.query_params.get(
+                "timeout", settings.GENERATION_STATUS_TIMEOUT))
+            if not math.isfinite(timeout):
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': "pending must be a list of ids and timeout a number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        timeout = max(0, min(timeout, settings.GENERATION_STATUS_TIMEOUT))
+
+        # The answer is produced asynchronously, so that waiting requests do
+        # not hold a thread.
+        response = StreamingHttpResponse(
+            self.wait_for_texts(pending, timeout),
+            content_type="application/json"
+        )
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    async def wait_for_texts(self, pending: List[int], timeout: float):
+        """
+        Check the pending texts again whenever a text of this process
+        finishes generation, and every GENERATION_STATUS_CHECK_INTERVAL
+        seconds for texts generated by other processes.
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            unfinished = {
+                pk async for pk in (
+                    Text
+                    .objects
+                    .filter(
+                        creator=self.request.user,
+                        pk__in=pending,
+                        has_finished_generation=False
+                    )
+                    .values_list("pk", flat=True)
+                )
+            }
+            finished = [pk for pk in pending if pk not in unfinished]
+
+            remaining = deadline - time.monotonic()
+            if finished or not pending or remaining <= 0:
+                break
+
+            await wait_for_finished_texts(
+                min(remaining, settings.GENERATION_STATUS_CHECK_INTERVAL))
+
+        yield CamelCaseJSONRenderer().render({"finished": finished})
+
+
+def clean_pasted_text(text: str) -> str:
+    # Replace "fi-\nnish" by "finish"
+    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+
+    # Replace "I\nam" by "I am"
+    text = re.sub(r'(\w+)\n(\w+)', r'\1 \2', text)
+
+    return text
+
+
+def save_text(
+        serializer: TextSerializer,
+        user: CustomUserModel,
+        tokenized_text: Optional[TokenizedText] = None):
+    """
+    Save a text pasted, from a picture or to generate, and schedule its
+    tokenization or generation if it takes long.
+
+    Parameters
+    ----------
+    serializer : TextSerializer
+        The validated text.
 
-        # For texts pasted or from pictures
-        if "text" in serializer.validated_data:
-            text = serializer.validated_data["text"]
+    user : CustomUserModel
+        The creator of the text.
 
-            # Replace "fi-\nnish" by "finish"
-            text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+    tokenized_text : Optional[Tuple[str, Dict]]
+        The pasted text, cleaned with clean_pasted_text and tokenized, if it
+        already is.
+    """
+    # For texts pasted or from pictures
+    if "text" in serializer.validated_data:
+        text = clean_pasted_text(serializer.validated_data["text"])
 
-            # Replace "I\nam" by "I am"
-            text = re.sub(r'(\w+)\n(\w+)', r'\1 \2', text)
+        language: Language = serializer.validated_data["language"]
 
-            language: Language = serializer.validated_data["language"]
+        # Long texts are tokenized chunk by chunk in the background, and
+        # saved after each chunk.
+        if tokenized_text is None and len(text) > settings.TOKENIZATION_CHUNK_LENGTH:
+            text_object: Text = serializer.save(
+                text="",
+                tokens=None,
+                has_finished_generation=False,
+                creator=user,
+                language=language
+            )
 
-            model = get_model_from_language(language.code)
-            text, lemmas = split_text_with_spacy(text, model)
+            submit_job(text_object, tokenize_text_object_in_chunks, text)
+
+        else:
+            text, tokens = (
+                tokenized_text or tokenize_text(text, language.code))
 
             serializer.save(
                 text=text,
-                lemmas=lemmas,
+                tokens=tokens,
                 has_finished_generation=True,
                 creator=user,
                 language=serializer.validated_data['language']
             )
 
-        # For generation using AI
-        if "subject" in serializer.validated_data:
+    # For generation using AI
+    if "subject" in serializer.validated_data:
+
+        if user.credit < settings.GPT_API_CALL_COST:
+            raise Exception(
+                "You don't have credit anymore. Please, contact us if you wish to use NeoTexto more."
+            )
 
-            if user.credit < settings.GPT_API_CALL_COST:
-                raise Exception(
-                    "You don't have credit anymore. Please, contact us if you wish to use NeoTexto more."
+        length = str(serializer.validated_data.pop('length', 50))
+        level = serializer.validated_data.pop('level', 'intermediate')
+        topic_should_be_random = serializer.validated_data.pop(
+            'topic_should_be_random', False)
+        language: Optional[Language] = serializer.validated_data.get(
+            'language')
+
+        # Texts about a random subject may have been generated in advance.
+        if topic_should_be_random and is_pooled(language, level, length):
+            pooled_text = take_pooled_text(language, level, length)
+
+            if pooled_text is not None:
+                user.credit -= settings.GPT_API_CALL_COST
+                user.save()
+
+                serializer.save(
+                    text=pooled_text.text,
+                    tokens=pooled_text.tokens,
+                    has_finished_generation=True,
+                    creator=user,
                 )
+                return serializer.data
 
-            length = serializer.validated_data.pop('length', 50)
-            level = serializer.validated_data.pop('level', 'intermediate')
+        text_object: Text = serializer.save(
+            text=f"Your text about {serializer.validated_data['subject']} is being generated...",
+            tokens=None,
+            has_finished_generation=False,
+            creator=user,
+        )
 
-            text_object: Text = serializer.save(
-                text=f"Your text about {serializer.validated_data['subject']} is being generated...",
-                lemmas="",
-                has_finished_generation=False,
-                creator=user,
-            )
+        submit_job(text_object, ask_gpt_to_generate_a_text, level, length)
+
+    return serializer.data
+
+
+def save_texts(serializer: TextBatchSerializer, user: CustomUserModel) -> List[Dict]:
+    """
+    Save the placeholders of a batch of texts to generate with one query,
+    and schedule their generation as one job, which counts as one job per
+    text toward the generation limits.
+    """
+    subjects: List[str] = serializer.validated_data["subjects"]
 
-            t = threading.Thread(
-                target=ask_gpt_to_generate_a_text,
-                args=[text_object, level, length],
-                daemon=True
+    if (settings.GENERATION_MAX_JOBS_PER_USER
+            and len(subjects) > settings.GENERATION_MAX_JOBS_PER_USER):
+        raise Exception(
+            f"You can't have more than {settings.GENERATION_MAX_JOBS_PER_USER} texts generated at the same time."
+        )
+
+    if user.credit < settings.GPT_API_CALL_COST * len(subjects):
+        raise Exception(
+            "You don't have enough credit for these texts. Please, contact us if you wish to use NeoTexto more."
+        )
+
+    language: Optional[Language] = serializer.validated_data.get("language")
+    level = serializer.validated_data["level"]
+    length = serializer.validated_data["length"]
+
+    text_objects = Text.objects.bulk_create([
+        Text(
+            subject=subject,
+            text=f"Your text about {subject} is being generated...",
+            tokens=None,
+            has_finished_generation=False,
+            creator=user,
+            language=language,
+        )
+        for subject in subjects
+    ])
+
+    try:
+        submit_job(
+            text_objects[0],
+            ask_gpt_to_generate_texts,
+            [text_object.pk for text_object in text_objects[1:]],
+            level,
+            length,
+            texts=len(text_objects)
+        )
+    except GenerationBusy:
+        Text.objects.filter(
+            pk__in=[text_object.pk for text_object in text_objects[1:]]
+        ).delete()
+        raise
+
+    return TextSerializer(text_objects, many=True).data
+
+
+def submit_job(text_object: Text, fn, *args, texts: int = 1):
+    """
+    Run `fn(text_object, *args)` in the background, in this process or,
+    with the "queue" generation backend, in run_generation_worker. The job
+    counts as `texts` jobs toward the limits. If the job cannot be
+    accepted, the text is deleted and GenerationBusy is raised.
+    """
+    try:
+        if settings.GENERATION_BACKEND == "queue":
+            enqueue_job(
+                text_object,
+                f"{fn.__module__}.{fn.__name__}",
+                list(args),
+                texts=texts
+            )
+        else:
+            get_generation_executor().submit(
+                fn,
+                text_object,
+                *args,
+                user=text_object.creator_id,
+                weight=texts
             )
-            t.start()
+    except GenerationBusy:
+        text_object.delete()
+        raise
+
+
+@async_api_view(['POST'])
+async def create_text(request):
+    """
+    Async version of TextViewSet.create, which tokenizes pasted texts
+    without holding a thread. Saving the text and scheduling its generation
+    are quick, and run in a thread.
+    """
+    user: CustomUserModel = request.user
+
+    serializer = TextSerializer(data=parse_json(request))
+    if not await sync_to_async(serializer.is_valid)():
+        return render_json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    tokenized_text = None
+    if "text" in serializer.validated_data:
+        text = clean_pasted_text(serializer.validated_data["text"])
+        language: Language = serializer.validated_data["language"]
 
-        return serializer.data
+        if len(text) <= settings.TOKENIZATION_CHUNK_LENGTH:
+            tokenized_text = await atokenize_text(text, language.code)
+
+    try:
+        data = await sync_to_async(save_text)(serializer, user, tokenized_text)
+    except GenerationBusy as e:
+        response = render_json(
+            {'error': str(e)}, status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(settings.GENERATION_RETRY_AFTER)
+        return response
+    except Exception as e:
+        return render_json({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    return render_json(data, status.HTTP_201_CREATED)
 
 
 class TranslationViewSet(
@@ -157,90 +531,299 @@ class TranslationViewSet(
         request: Any = self.request
         user: CustomUserModel = request.user
 
-        if user.credit < settings.TRANSLATION_API_CALL_COST:
-            raise Exception(
-                "You don't have credit anymore. Please, contact us if you wish to use NeoTexto more."
-            )
+        word_to_translate, language_from, language_to, provider = (
+            get_translation_request(serializer.validated_data, user)
+        )
 
-        word_to_translate = serializer.validated_data["word_source"]["word"]
-        language_from = serializer.validated_data["word_source"]["language"]
-        language_to = serializer.validated_data["word_target"]["language"]
-        provider = serializer.validated_data["provider"] or "microsoft"
+        data = get_cached_translations(
+            word_to_translate, language_from, language_to, provider)
 
-        if (not word_to_translate
-            or not language_to
-                or not language_from):
-            raise Exception("Invalid API call.")
+        if data is None:
+            data = lookup_translations(
+                word_to_translate, language_from, language_to, provider)
 
-        if language_to == language_from:
-            raise Exception(
-                "The target language is the same as the source language. You may want to change your mother tongue in your profile."
-            )
+        charge_for_translation(user)
+        return data
 
-        # serializer.validated_data.word_source is the word we want to translate
-        # serializer.validated_data.word_target contains the language we want to translate to
-        filters = Q(
-            word_source__word=word_to_translate,
-            word_source__language=language_from,
-            word_target__language=language_to,
-            provider=provider,
+
+def get_translation_request(validated_data, user: CustomUserModel) -> Tuple[str, Language, Language, str]:
+    """
+    Return the word to translate, its language, the target language and the
+    provider of a validated TranslationSerializer.
+
+    Raises
+    ------
+    Exception
+        If the user has no credit left or the request is invalid.
+    """
+    if user.credit < settings.TRANSLATION_API_CALL_COST:
+        raise Exception(
+            "You don't have credit anymore. Please, contact us if you wish to use NeoTexto more."
         )
 
-        translations = (
-            Translation
-            .objects
-            .filter(filters)
-            .select_related('word_source', 'word_target')
-            .prefetch_related('example_set')
-            .prefetch_related(
-                Prefetch('usertranslation_set', queryset=UserTranslation.objects.filter(
-                    user=user))
-            )
+    word_to_translate = validated_data["word_source"]["word"]
+    language_from = validated_data["word_source"]["language"]
+    language_to = validated_data["word_target"]["language"]
+    provider = validated_data["provider"] or "microsoft"
+
+    if (not word_to_translate
+        or not language_to
+            or not language_from):
+        raise Exception("Invalid API call.")
+
+    if language_to == language_from:
+        raise Exception(
+            "The target language is the same as the source language. You may want to change your mother tongue in your profile."
         )
 
+    return word_to_translate, language_from, language_to, provider
+
+
+def lookup_translations(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> Dict:
+    """
+    Return the serialized translations of the word, saved or asked to the
+    provider, and cache them.
+
+    Concurrent lookups of the same translations are collapsed into one, in
+    this process and, with settings.TRANSLATION_SHARED_LOCK, across
+    processes: the provider is called, and the words and translations are
+    saved, once.
+    """
+    return translation_flight.do(
+        get_translation_cache_key(
+            word_to_translate, language_from.pk, language_to.pk, provider),
+        find_or_translate,
+        word_to_translate,
+        language_from,
+        language_to,
+        provider
+    )
+
+
+def find_or_translate(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> Dict:
+    locked = False
+    if settings.TRANSLATION_SHARED_LOCK:
+        locked = lock_translations(
+            word_to_translate, language_from, language_to, provider)
+
+        if not locked:
+            # Another process is looking them up.
+            data = wait_for_translations(
+                word_to_translate, language_from, language_to, provider)
+            if data is not None:
+                return data
+
+    try:
+        translations = find_translations(
+            word_to_translate, language_from, language_to, provider)
+
         if not translations:
-            if provider == 'microsoft':
-                translations = get_microsoft_translation(
-                    word_to_translate,
-                    language_from,
-                    language_to
-                )
-            elif provider == 'yandex':
-                translations = get_yandex_translation(
-                    word_to_translate,
-                    language_from,
-                    language_to
-                )
-            elif provider == 'chatgpt':
-                translations = get_chatgpt_translation(
-                    word_to_translate,
-                    language_from,
-                    language_to
-                )
+            translations = translate(
+                word_to_translate, language_from, language_to, provider)
 
-        data = {
-            "word": {
-                "word": word_to_translate,
-                "language": LanguageModelSerializer(language_from).data,
-            },
-            "translations": [
-                TranslationSerializer(t).data
-                for t in translations
-            ]
-        }
+        data = serialize_translations(
+            word_to_translate, language_from, translations)
 
-        for idx, t in enumerate(data["translations"]):
-            examples = Example.objects.filter(translation=translations[idx])
-            t["examples"] = [
-                ExampleSerializer(e).data
-                for e in examples
-            ]
+        cache_translations(
+            word_to_translate, language_from, language_to, provider, data)
+        return data
 
-        user.credit -= settings.TRANSLATION_API_CALL_COST
-        user.save()
+    finally:
+        if locked:
+            unlock_translations(
+                word_to_translate, language_from, language_to, provider)
+
+
+def find_translations(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> List[Translation]:
+    """
+    Return the translations of the word already saved for this provider.
+    """
+    filters = Q(
+        word_source__word=word_to_translate,
+        word_source__language=language_from,
+        word_target__language=language_to,
+        provider=provider,
+    )
+
+    return list(
+        Translation
+        .objects
+        .filter(filters)
+        .select_related('word_source', 'word_target')
+        .prefetch_related('example_set')
+    )
+
+
+def translate(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> List[Translation]:
+    """
+    Ask the provider for the translations of the word, and save them.
+    """
+    if provider == 'microsoft':
+        return get_microsoft_translation(
+            word_to_translate,
+            language_from,
+            language_to
+        )
+    elif provider == 'yandex':
+        return get_yandex_translation(
+            word_to_translate,
+            language_from,
+            language_to
+        )
+    elif provider == 'chatgpt':
+        return get_chatgpt_translation(
+            word_to_translate,
+            language_from,
+            language_to
+        )
+    return []
+
+
+def serialize_translations(
+        word_to_translate: str,
+        language_from: Language,
+        translations: List[Translation]) -> Dict:
+    """
+    Serialize the translations of the word with their examples.
+    """
+    data = {
+        "word": {
+            "word": word_to_translate,
+            "language": LanguageModelSerializer(language_from).data,
+        },
+        "translations": [
+            TranslationSerializer(t).data
+            for t in translations
+        ]
+    }
+
+    for idx, t in enumerate(data["translations"]):
+        # Prefetched by find_translations.
+        examples = translations[idx].example_set.all()
+        t["examples"] = [
+            ExampleSerializer(e).data
+            for e in examples
+        ]
+
+    return data
+
+
+def charge_for_translation(user: CustomUserModel):
+    user.credit -= settings.TRANSLATION_API_CALL_COST
+    user.save()
+
+
+@async_api_view(['POST'])
+async def create_translation(request):
+    """
+    Async version of TranslationViewSet.create (see afind_or_translate).
+    """
+    user: CustomUserModel = request.user
+
+    serializer = TranslationSerializer(data=parse_json(request))
+    if not await sync_to_async(serializer.is_valid)():
+        return render_json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        word_to_translate, language_from, language_to, provider = (
+            get_translation_request(serializer.validated_data, user)
+        )
+
+        data = await aget_cached_translations(
+            word_to_translate, language_from, language_to, provider)
+
+        if data is None:
+            data = await alookup_translations(
+                word_to_translate, language_from, language_to, provider)
+
+        await sync_to_async(charge_for_translation)(user)
+    except Exception as e:
+        return render_json({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    return render_json(data, status.HTTP_201_CREATED)
+
+
+async def alookup_translations(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> Dict:
+    """
+    Async version of lookup_translations.
+    """
+    return await translation_flight.ado(
+        get_translation_cache_key(
+            word_to_translate, language_from.pk, language_to.pk, provider),
+        afind_or_translate,
+        word_to_translate,
+        language_from,
+        language_to,
+        provider
+    )
+
+
+async def afind_or_translate(
+        word_to_translate: str,
+        language_from: Language,
+        language_to: Language,
+        provider: str) -> Dict:
+    """
+    Async version of find_or_translate. ChatGPT is called without holding a
+    thread. Microsoft and Yandex, whose answers are saved in many steps, are
+    called in a thread.
+    """
+    locked = False
+    if settings.TRANSLATION_SHARED_LOCK:
+        locked = await sync_to_async(lock_translations)(
+            word_to_translate, language_from, language_to, provider)
+
+        if not locked:
+            # Another process is looking them up.
+            data = await await_translations(
+                word_to_translate, language_from, language_to, provider)
+            if data is not None:
+                return data
+
+    try:
+        translations = await sync_to_async(find_translations)(
+            word_to_translate, language_from, language_to, provider)
 
+        if not translations:
+            if provider == 'chatgpt':
+                translations = await aget_chatgpt_translation(
+                    word_to_translate, language_from, language_to)
+            else:
+                translations = await sync_to_async(translate)(
+                    word_to_translate, language_from, language_to, provider)
+
+        data = await sync_to_async(serialize_translations)(
+            word_to_translate, language_from, translations)
+
+        await sync_to_async(cache_translations)(
+            word_to_translate, language_from, language_to, provider, data)
         return data
 
+    finally:
+        if locked:
+            await sync_to_async(unlock_translations)(
+                word_to_translate, language_from, language_to, provider)
+
 
 @permission_classes([UserTranslationPermission])
 class UserTranslationViewSet(
@@ -289,8 +872,8 @@ class LanguageViewSet(
         return Language.objects.all()
 
 
-@api_view(['POST'])
-def detect_text(request):
+@async_api_view(['POST'])
+async def detect_text(request):
     user: CustomUserModel = request.user
 
     if user.credit < settings.IMAGE_API_CALL_COST:
@@ -303,18 +886,21 @@ def detect_text(request):
     else:
         return JsonResponse({'error': 'No file'})
 
-    client: Any = vision.ImageAnnotatorClient()
+    client = get_async_vision_client()
     image = vision.Image(content=content)
 
-    response = client.text_detection(image=image)
+    result = await client.batch_annotate_images(requests=[
+        vision.AnnotateImageRequest(
+            image=image,
+            features=[
+                vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+            ],
+        )
+    ])
+    response = result.responses[0]
     full_text_annotation = response.full_text_annotation
 
-    detected_text = full_text_annotation.text
-
-    # Replace "fi-\nnish" by "finish"
-    detected_text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', detected_text)
-    # Replace "I\nam" by "I am"
-    detected_text = re.sub(r'(\w+)\n(\w+)', r'\1 \2', detected_text)
+    detected_text = clean_pasted_text(full_text_annotation.text)
 
     detected_language_code = (
         full_text_annotation
@@ -325,10 +911,10 @@ def detect_text(request):
     )
 
     user.credit -= settings.IMAGE_API_CALL_COST
-    user.save()
+    await user.asave()
 
     try:
-        detected_language = Language.objects.get(code=detected_language_code)
+        detected_language = await Language.objects.aget(code=detected_language_code)
     except Language.DoesNotExist:
         raise Exception(
             f"The language with code {detected_language_code} does not exist in our database.")
@@ -365,3 +951,23 @@ def contact(request):
         return JsonResponse(serializer.errors, status=400)
 
     return JsonResponse({"ok": "ok"})
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def ready(request):
+    """
+    Readiness probe. Returns 503 until the spaCy warm-up has finished.
+    Also reports the loaded models and the reuse of connections to OpenAI.
+    """
+    ready = is_ready()
+    return JsonResponse(
+        {
+            "ready": ready,
+            "models": model_registry.stats(),
+            "openai": get_openai_connection_stats(),
+            "text_pool": get_text_pool_stats(),
+        },
+        status=200 if ready else 503
+    )
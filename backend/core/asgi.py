@@ -13,4 +13,33 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.utils.nlp import start_warm_up  # noqa: E402
+
+
+async def lifespan(scope, receive, send):
+    """
+    Handle the ASGI lifespan protocol, which Django does not implement.
+
+    On startup the spaCy warm-up is started in the background, so the server
+    accepts connections right away while /back/api/ready/ reports 503 until
+    the configured models are loaded.
+    """
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            start_warm_up()
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
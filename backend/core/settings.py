@@ -1,4 +1,6 @@
 import os
+import tempfile
+import warnings
 from datetime import timedelta
 from pathlib import Path
 
@@ -181,6 +183,72 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Tokenization results, keyed on the content hash of the text.
+    "tokenization": {
+        "BACKEND": os.environ.get(
+            "TOKENIZATION_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("TOKENIZATION_CACHE_LOCATION", "tokenization"),
+        "TIMEOUT": int(os.environ.get("TOKENIZATION_CACHE_TIMEOUT", 7 * 24 * 3600)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("TOKENIZATION_CACHE_MAX_ENTRIES", 1000)),
+        },
+    },
+    # Generated texts, keyed on their prompt (see GENERATION_CACHE_ENABLED).
+    "generations": {
+        "BACKEND": os.environ.get(
+            "GENERATION_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("GENERATION_CACHE_LOCATION", "generations"),
+        "TIMEOUT": int(os.environ.get("GENERATION_CACHE_TIMEOUT", 24 * 3600)),
+    },
+    # Serialized translations of words, shared by the processes of the
+    # backend. Each process also keeps the most used ones in memory (see
+    # TRANSLATION_CACHE_LOCAL_MAX_ENTRIES).
+    "translations": {
+        "BACKEND": os.environ.get(
+            "TRANSLATION_CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get(
+            "TRANSLATION_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "neotexto-translations")
+        ),
+        "TIMEOUT": int(os.environ.get("TRANSLATION_CACHE_TIMEOUT", 7 * 24 * 3600)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("TRANSLATION_CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+}
+
+# Translations kept in memory by each process, and for how many seconds.
+# Translations changed in another process may be served for that long.
+TRANSLATION_CACHE_LOCAL_MAX_ENTRIES = int(
+    os.environ.get("TRANSLATION_CACHE_LOCAL_MAX_ENTRIES", 1024))
+TRANSLATION_CACHE_LOCAL_TIMEOUT = 300
+# Seconds words without translation, for a provider and a language pair, are
+# remembered before the provider is asked again.
+TRANSLATION_NEGATIVE_CACHE_TIMEOUT = int(
+    os.environ.get("TRANSLATION_NEGATIVE_CACHE_TIMEOUT", 24 * 3600))
+# Concurrent lookups of the same word are collapsed in each process. With
+# TRANSLATION_SHARED_LOCK=1, they are also collapsed across processes with a
+# lock in the "translations" cache: other processes poll the cache every
+# TRANSLATION_LOCK_POLL_INTERVAL seconds for the translations, for at most
+# TRANSLATION_LOCK_TIMEOUT seconds.
+TRANSLATION_SHARED_LOCK = int(os.environ.get("TRANSLATION_SHARED_LOCK", 0))
+TRANSLATION_LOCK_TIMEOUT = 10
+TRANSLATION_LOCK_POLL_INTERVAL = 0.05
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -266,7 +334,185 @@ AUTHENTICATION_BACKENDS = (
 MICROSOFT_TRANSLATION_API_KEY = os.environ.get("MICROSOFT_TRANSLATION_API_KEY")
 YANDEX_DICTIONNARY_API_KEY = os.environ.get("YANDEX_DICTIONNARY_API_KEY")
 
+# HTTP session to Microsoft and Yandex, shared by the threads of a process:
+# kept-alive connections, timeouts in seconds, and retries of requests
+# failing with connection errors, 429 and 5xx, waiting
+# PROVIDER_HTTP_BACKOFF * 2 ** (retry - 1) seconds between them.
+PROVIDER_HTTP_MAX_CONNECTIONS = int(
+    os.environ.get("PROVIDER_HTTP_MAX_CONNECTIONS", default=20))
+PROVIDER_HTTP_CONNECT_TIMEOUT = float(
+    os.environ.get("PROVIDER_HTTP_CONNECT_TIMEOUT", default=3))
+PROVIDER_HTTP_TIMEOUT = float(
+    os.environ.get("PROVIDER_HTTP_TIMEOUT", default=10))
+PROVIDER_HTTP_MAX_RETRIES = int(
+    os.environ.get("PROVIDER_HTTP_MAX_RETRIES", default=2))
+PROVIDER_HTTP_BACKOFF = 0.3
+# Microsoft dictionary lookups and examples in the same languages, asked
+# within MICROSOFT_BATCH_WINDOW_MS milliseconds, are sent in one request of
+# at most MICROSOFT_BATCH_MAX_ITEMS items (0 ms sends each one at once).
+MICROSOFT_BATCH_WINDOW_MS = int(
+    os.environ.get("MICROSOFT_BATCH_WINDOW_MS", default=20))
+MICROSOFT_BATCH_MAX_ITEMS = 10
+
 USER_INITIAL_CREDIT = 100  # 100 = 1 dollar
 IMAGE_API_CALL_COST = 1
 TRANSLATION_API_CALL_COST = 1
 GPT_API_CALL_COST = 1
+
+# Logging
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["console"],
+            "level": os.environ.get("API_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
+# spaCy
+
+# Maximum number of spaCy models kept loaded per process (0 = no limit).
+SPACY_MODEL_CACHE_MAX_MODELS = int(
+    os.environ.get("SPACY_MODEL_CACHE_MAX_MODELS", default=0))
+# Maximum memory taken by loaded spaCy models per process (0 = no limit).
+SPACY_MODEL_CACHE_MAX_MEMORY_MB = int(
+    os.environ.get("SPACY_MODEL_CACHE_MAX_MEMORY_MB", default=0))
+# Languages whose model is never evicted once loaded.
+SPACY_PINNED_LANGUAGES = os.environ.get(
+    "SPACY_PINNED_LANGUAGES", default="en fr").split()
+# Languages whose model is loaded when the server starts. /back/api/ready/
+# only reports ready once they are loaded.
+SPACY_WARMUP_LANGUAGES = os.environ.get(
+    "SPACY_WARMUP_LANGUAGES", default="").split()
+# Maximum length of a text, in characters.
+TEXT_MAX_LENGTH = int(os.environ.get("TEXT_MAX_LENGTH", default=10000))
+# Texts longer than this are tokenized in chunks of at most this length, and
+# saved after each chunk.
+TOKENIZATION_CHUNK_LENGTH = int(
+    os.environ.get("TOKENIZATION_CHUNK_LENGTH", default=2000))
+# Number of worker processes tokenizing texts outside of the request threads
+# (0 = tokenize in the request thread).
+TOKENIZATION_WORKERS = int(os.environ.get("TOKENIZATION_WORKERS", default=0))
+# nlp.pipe() options used to tokenize texts in bulk.
+TOKENIZATION_BATCH_SIZE = int(
+    os.environ.get("TOKENIZATION_BATCH_SIZE", default=64))
+TOKENIZATION_N_PROCESS = int(
+    os.environ.get("TOKENIZATION_N_PROCESS", default=1))
+# Pipeline profile spaCy models are loaded with ("lemma" or "full", see
+# api.utils.nlp.PIPELINE_PROFILES), and per-language overrides such as
+# "ja:full zh:full". Entries without ":" are ignored, and unknown profiles
+# are reported by the api.E001 system check.
+SPACY_DEFAULT_PIPELINE_PROFILE = os.environ.get(
+    "SPACY_DEFAULT_PIPELINE_PROFILE", default="lemma")
+SPACY_PIPELINE_PROFILES = {}
+for item in os.environ.get("SPACY_PIPELINE_PROFILES", default="").split():
+    if ":" not in item:
+        warnings.warn(
+            f"Ignoring SPACY_PIPELINE_PROFILES entry {item!r}: expected "
+            f"language:profile."
+        )
+        continue
+    language_code, profile = item.split(":", 1)
+    SPACY_PIPELINE_PROFILES[language_code] = profile
+
+# OpenAI
+
+# One client, and pool of connections, is shared by each process.
+OPENAI_MAX_CONNECTIONS = int(
+    os.environ.get("OPENAI_MAX_CONNECTIONS", default=20))
+# Seconds an idle connection is kept alive.
+OPENAI_KEEPALIVE_EXPIRY = 60
+# Seconds to connect, and to wait for each read or write.
+OPENAI_CONNECT_TIMEOUT = 5
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", default=60))
+# Retries of requests failing with connection errors, 408, 409, 429 and 5xx,
+# with an exponential backoff.
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", default=2))
+
+# Text generation
+
+# "thread" runs generation jobs in the web process. "queue" stores them in the
+# database, for `python manage.py run_generation_worker` processes to run.
+GENERATION_BACKEND = os.environ.get("GENERATION_BACKEND", default="thread")
+# Jobs of the "queue" backend are tried this many times, waiting
+# GENERATION_JOB_BACKOFF * 2 ** (attempt - 1) seconds between attempts.
+GENERATION_JOB_MAX_ATTEMPTS = int(
+    os.environ.get("GENERATION_JOB_MAX_ATTEMPTS", default=3))
+GENERATION_JOB_BACKOFF = 5
+# Seconds after which a running job is considered abandoned by its worker.
+GENERATION_JOB_TIMEOUT = 300
+
+# Number of texts generated at the same time per process.
+GENERATION_MAX_WORKERS = int(os.environ.get("GENERATION_MAX_WORKERS", default=8))
+# Number of texts waiting to be generated per process. Requests beyond are
+# answered with 429.
+GENERATION_QUEUE_SIZE = int(os.environ.get("GENERATION_QUEUE_SIZE", default=32))
+# Number of texts a user can have waiting or being generated (0 = no limit).
+GENERATION_MAX_JOBS_PER_USER = int(
+    os.environ.get("GENERATION_MAX_JOBS_PER_USER", default=3))
+# Seconds clients are asked to wait before retrying when the queue is full.
+GENERATION_RETRY_AFTER = 10
+# Number of texts a request to /back/api/texts/batch/ can create, and of
+# texts of a batch asked to OpenAI at the same time.
+GENERATION_BATCH_MAX_SIZE = int(
+    os.environ.get("GENERATION_BATCH_MAX_SIZE", default=10))
+GENERATION_BATCH_CONCURRENCY = int(
+    os.environ.get("GENERATION_BATCH_CONCURRENCY", default=4))
+# Completions are limited to GENERATION_TOKENS_PER_WORD tokens per requested
+# word (more in languages like Russian, Japanese or Chinese and at higher
+# levels, see api.utils.generation_plan) plus GENERATION_EXTRA_TOKENS, and
+# abandoned after GENERATION_TIMEOUT_BASE seconds plus the time to write them
+# at GENERATION_TOKENS_PER_SECOND (at most OPENAI_TIMEOUT). Texts cut by the
+# limit end at their last complete sentence. See the GenerationStat admin
+# and `python manage.py generation_stats` to tune them.
+GENERATION_TOKENS_PER_WORD = float(
+    os.environ.get("GENERATION_TOKENS_PER_WORD", default=2.5))
+GENERATION_EXTRA_TOKENS = 32
+GENERATION_TIMEOUT_BASE = 10
+GENERATION_TOKENS_PER_SECOND = 30
+# Tokens of the answers of the sentence game.
+GRADING_MAX_TOKENS = int(os.environ.get("GRADING_MAX_TOKENS", default=256))
+# Serve the text generated for a prompt again, at most
+# GENERATION_CACHE_MAX_REUSES times, to users asking for the same text, and
+# generate identical prompts requested at the same time once.
+GENERATION_CACHE_ENABLED = int(
+    os.environ.get("GENERATION_CACHE_ENABLED", default=0))
+GENERATION_CACHE_MAX_REUSES = int(
+    os.environ.get("GENERATION_CACHE_MAX_REUSES", default=3))
+
+# Number of texts about a random subject generated in advance per language,
+# level and length (0 disables the pool). Pooled texts are served at once
+# and the pool is refilled in the background, at most TEXT_POOL_REFILL_RATE
+# texts per minute per process (0 disables background refills: the pools are
+# only filled, without a limit, by the fill_text_pool command).
+TEXT_POOL_SIZE = int(os.environ.get("TEXT_POOL_SIZE", default=0))
+TEXT_POOL_REFILL_RATE = float(
+    os.environ.get("TEXT_POOL_REFILL_RATE", default=6))
+# Language codes with a pool (empty = all languages).
+TEXT_POOL_LANGUAGES = os.environ.get(
+    "TEXT_POOL_LANGUAGES", default="en fr").split()
+TEXT_POOL_LEVELS = os.environ.get(
+    "TEXT_POOL_LEVELS", default="beginner intermediate advanced").split()
+TEXT_POOL_LENGTHS = os.environ.get(
+    "TEXT_POOL_LENGTHS", default="50 200").split()
+
+# Seconds a client can stay connected to the stream of a text being
+# generated, between keep-alives while the text is streamed, and between
+# checks of the database while it waits for a worker.
+GENERATION_STREAM_TIMEOUT = 180
+GENERATION_STREAM_KEEP_ALIVE = 15
+GENERATION_STREAM_POLL_INTERVAL = 1
+
+# Seconds a request to /back/api/texts/status/ waits for pending texts to
+# finish generation, and between checks of the database for the texts
+# generated by other processes.
+GENERATION_STATUS_TIMEOUT = 25
+GENERATION_STATUS_CHECK_INTERVAL = 2
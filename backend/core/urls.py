@@ -32,8 +32,12 @@ from api.views import (
     UserTranslationViewSet,
     UserViewSet,
     contact,
-    detect_text
+    create_text,
+    create_translation,
+    detect_text,
+    ready
 )
+from api.utils.asynchronous import post_async
 
 router = routers.DefaultRouter()
 router.register(r"texts", TextViewSet, basename="text")
@@ -47,6 +51,18 @@ urlpatterns = (
     [
         path('back/admin/', admin.site.urls),
 
+        # Texts and translations are created asynchronously, as they may
+        # wait for OpenAI or a translation provider.
+        path(
+            'back/api/texts/',
+            post_async(create_text, TextViewSet.as_view(
+                {'get': 'list', 'post': 'create'}))
+        ),
+        path(
+            'back/api/translations/',
+            post_async(create_translation, TranslationViewSet.as_view(
+                {'get': 'list', 'post': 'create'}))
+        ),
         path('back/api/', include(router.urls)),
         path('back/api/social/login/google/',
              GoogleLoginView.as_view(),
@@ -73,6 +89,7 @@ urlpatterns = (
 
         path('back/api/detect-text/', detect_text),
         path('back/api/contact/', contact),
+        path('back/api/ready/', ready),
         path('back/api/game/create-sentence/', create_sentence),
 
         # Unused in django, it's an address for the front.
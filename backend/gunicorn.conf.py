@@ -0,0 +1,39 @@
+"""
+Gunicorn config to serve the ASGI application with several uvicorn workers.
+
+The application and the spaCy models of SPACY_WARMUP_LANGUAGES are loaded
+once in the master process, then workers are forked. Workers share the
+read-only model memory copy-on-write, so adding workers does not multiply
+the memory taken by each model.
+
+    gunicorn -c gunicorn.conf.py core.asgi:application
+"""
+
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Import Django and core.asgi in the master, before forking.
+preload_app = True
+
+
+def when_ready(server):
+    from api.utils.nlp import start_warm_up
+
+    start_warm_up(block=True)
+
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # that collections in the workers do not write to (and copy) the pages
+    # shared with the master.
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    from django.db import connections
+
+    # Connections must not be shared between processes.
+    connections.close_all()
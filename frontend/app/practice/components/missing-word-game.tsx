@@ -5,7 +5,7 @@ import { useGeneratedTexts } from "@/app/providers/generated-texts-provider";
 import { useLanguageContext } from "@/app/providers/language-provider";
 import { useToastContext } from "@/app/providers/toast-provider";
 import { axiosPublic } from "@/lib/axios";
-import { shuffle } from "@/lib/utils";
+import { getWordsAndLemmas, shuffle } from "@/lib/utils";
 import { UserTranslationInterface } from "@/types/types";
 import * as Accordion from "@radix-ui/react-accordion";
 import { CheckCircledIcon, ChevronDownIcon } from "@radix-ui/react-icons";
@@ -85,25 +85,39 @@ export default function MissingWordGame({ setShowMissingWordGame }) {
     const newListOfInstances: MissingWordGameInstance[] = [];
 
     for (let text of generatedTexts) {
-      const sentence_text = text.text.split(/[\.\n]+/g);
-      const sentence_lemmas = text.lemmas.split(/[\.\n]+/g);
+      if (!text.tokens) {
+        continue;
+      }
 
-      for (let sentence_idx in sentence_text) {
-        const sentence = sentence_text[sentence_idx].split(/_\$_/);
-        const lemmas = sentence_lemmas[sentence_idx].split(/_\$_/);
+      const { words, lemmas, sentences } = getWordsAndLemmas(text);
+
+      for (
+        let sentence_idx = 0;
+        sentence_idx < sentences.length;
+        sentence_idx++
+      ) {
+        const start = sentences[sentence_idx];
+        const end =
+          sentence_idx + 1 < sentences.length
+            ? sentences[sentence_idx + 1]
+            : words.length;
+        const sentence = words.slice(start, end);
+        const sentenceLemmas = lemmas.slice(start, end);
 
         for (let userTranslation of userTranslations) {
           const wordSource = userTranslation.translation.wordSource.word;
-          const wordIdx = lemmas.findIndex((l) => l == wordSource);
+          const wordIdx = sentenceLemmas.findIndex((l) => l == wordSource);
 
           if (wordIdx > -1) {
-            const sentenceComplete = sentence.join(" ").trim() + ".";
+            const sentenceComplete = sentence.join("").trim();
             const goodAnswer = sentence[wordIdx];
 
             let sentenceIncompleteArray = sentence.slice();
-            sentenceIncompleteArray[wordIdx] = "......";
-            const sentenceIncomplete =
-              sentenceIncompleteArray.join(" ").trim() + ".";
+            sentenceIncompleteArray[wordIdx] = goodAnswer.replace(
+              /\S+/,
+              "......",
+            );
+            const sentenceIncomplete = sentenceIncompleteArray.join("").trim();
 
             const instance: MissingWordGameInstance = {
               sentenceComplete,
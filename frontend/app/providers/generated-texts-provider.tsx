@@ -10,6 +10,7 @@ import {
   useCallback,
   useContext,
   useEffect,
+  useRef,
   useState,
 } from "react";
 import { useLanguageContext } from "./language-provider";
@@ -34,12 +35,13 @@ export default function GeneratedTextsProvider({
 }) {
   const axiosPublic = useAxiosAuth();
 
-  const { status }: any = useSession();
+  const { data: session, status }: any = useSession();
   const { setTextLanguage } = useLanguageContext();
 
   const [textPanelIsVisible, setTextPanelIsVisible] = useState(false);
   const [generatedTexts, setGeneratedTexts] = useState<TextInterface[]>([]);
   const [idxTextFocusedOn, setIdxTextFocusedOn] = useState("-1");
+  const streamedTextIds = useRef(new Set<string>());
 
   const fetchTexts = useCallback(async () => {
     const res = await axiosPublic.get("/back/api/texts/");
@@ -58,31 +60,138 @@ export default function GeneratedTextsProvider({
     }
   }, [status, fetchTexts]);
 
-  // useEffect to make API call every second if any text has not finished generation
+  // Read a text being generated, or a long pasted text being tokenized, as
+  // the server streams it: "chunk" events carry the next part of the text,
+  // the "text" event the saved text.
+  const streamText = useCallback(
+    async (textId: string) => {
+      const res = await fetch(
+        `${process.env.NEXT_PUBLIC_BACKEND_URL}/back/api/texts/${textId}/stream/`,
+        {
+          headers: {
+            Accept: "text/event-stream",
+            Authorization: `Bearer ${session?.user?.access}`,
+          },
+        },
+      );
+      if (!res.ok || !res.body) {
+        throw new Error(`Streaming text ${textId} failed: ${res.status}`);
+      }
+
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = "";
+      let streamedText = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += value;
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+
+        for (const event of events) {
+          let name = "message";
+          let data = "";
+
+          for (const line of event.split("\n")) {
+            if (line.startsWith("event: ")) name = line.slice(7);
+            if (line.startsWith("data: ")) data += line.slice(6);
+          }
+
+          if (name == "chunk") {
+            streamedText += JSON.parse(data).text;
+            const text = streamedText;
+            setGeneratedTexts((texts) =>
+              texts.map((t) => (t.id == textId ? { ...t, text } : t)),
+            );
+          } else if (name == "text") {
+            const savedText: TextInterface = JSON.parse(data);
+            setGeneratedTexts((texts) =>
+              texts.map((t) => (t.id == textId ? savedText : t)),
+            );
+          }
+        }
+      }
+    },
+    [session],
+  );
+
+  // useEffect to stream every text that has not finished generation
+  useEffect(() => {
+    generatedTexts
+      .filter(
+        (text) =>
+          !text.hasFinishedGeneration &&
+          !streamedTextIds.current.has(text.id),
+      )
+      .forEach((text) => {
+        streamedTextIds.current.add(text.id);
+
+        streamText(text.id)
+          .catch((error) => {
+            console.error("Error streaming text:", error);
+          })
+          .finally(() => {
+            streamedTextIds.current.delete(text.id);
+          });
+      });
+  }, [generatedTexts, streamText]);
+
+  const pendingTextIds = generatedTexts
+    .filter((text) => !text.hasFinishedGeneration)
+    .map((text) => text.id)
+    .join(",");
+
+  // useEffect to wait for texts being generated to finish, and to fetch
+  // only those which have finished
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        await fetchTexts();
-      } catch (error) {
-        console.error("Error fetching data:", error);
+    if (!pendingTextIds) return;
+
+    let cancelled = false;
+
+    const waitForTexts = async () => {
+      while (!cancelled) {
+        try {
+          const res = await axiosPublic.get("/back/api/texts/status/", {
+            params: { pending: pendingTextIds, timeout: 25 },
+          });
+          const finished: string[] = res.data.finished.map(String);
+
+          if (cancelled || finished.length == 0) continue;
+
+          // Texts which have been deleted meanwhile are removed.
+          const finishedTexts = await Promise.all(
+            finished.map((id) =>
+              axiosPublic
+                .get(`/back/api/texts/${id}/`)
+                .then((res) => res.data as TextInterface)
+                .catch(() => null),
+            ),
+          );
+
+          setGeneratedTexts((texts) =>
+            texts.flatMap((text) => {
+              const idx = finished.indexOf(String(text.id));
+              if (idx == -1) return [text];
+              const finishedText = finishedTexts[idx];
+              return finishedText ? [finishedText] : [];
+            }),
+          );
+          return;
+        } catch (error) {
+          console.error("Error fetching data:", error);
+          await new Promise((resolve) => setTimeout(resolve, 2000));
+        }
       }
     };
 
-    // Check if any text has not finished generation
-    const shouldMakeAPICall = generatedTexts.some(
-      (text) => !text.hasFinishedGeneration,
-    );
-
-    // If at least one text has not finished generation, make the API call every second
-    if (shouldMakeAPICall) {
-      const intervalId = setInterval(fetchData, 2000);
+    waitForTexts();
 
-      // Clean up the interval when the component unmounts or when the dependency changes
-      return () => {
-        clearInterval(intervalId);
-      };
-    }
-  }, [generatedTexts, fetchTexts]);
+    return () => {
+      cancelled = true;
+    };
+  }, [pendingTextIds, axiosPublic]);
 
   return (
     <>
@@ -57,8 +57,11 @@ export default function SearchForm() {
       setGeneratedTexts([textObject].concat(generatedTexts));
       setIdxTextFocusedOn(textObject.id);
       setTextSubject("");
-    } catch (err) {
-      // TODO: Handle properly.
+    } catch (err: any) {
+      // E.g. when the server is too busy to generate a text right now.
+      if (err.response?.data?.error) {
+        setError(err.response.data.error);
+      }
     }
 
     setTextIsBeingGenerated(false);
@@ -132,7 +132,7 @@ export default function TextList({ setMobileMenuIsOpen }) {
                             WebkitBoxOrient: "vertical",
                           }}
                         >
-                          {text.text.replace(/_\$_/g, "")}
+                          {text.text}
                         </p>
                       </Link>
                       <TextOption
@@ -5,6 +5,7 @@ import { useGeneratedTexts } from "@/app/providers/generated-texts-provider";
 import { useToastContext } from "@/app/providers/toast-provider";
 import { useUserContext } from "@/app/providers/user-provider";
 import useAxiosAuth from "@/lib/hooks/use-axios-auth";
+import { getWordsAndLemmas } from "@/lib/utils";
 import {
   DefinitionInterface,
   TextInterface,
@@ -13,6 +14,7 @@ import {
 } from "@/types/types";
 import * as Accordion from "@radix-ui/react-accordion";
 import { ChevronDownIcon } from "@radix-ui/react-icons";
+import { useMemo } from "react";
 import CloseIcon from "../icons/close";
 
 export default function Text() {
@@ -46,15 +48,19 @@ export default function Text() {
     (text) => text.id == idxTextFocusedOn,
   )[0];
 
+  const { words: listOfWords, lemmas: listOfLemmas } = useMemo(
+    () =>
+      displayedText
+        ? getWordsAndLemmas(displayedText)
+        : { words: [] as string[], lemmas: [] as string[] },
+    [displayedText],
+  );
+
   let textLanguage: string | null = null;
-  let listOfWords: string[] = [];
-  let listOfLemmas: string[] = [];
   let listOfUserTranslationsInThisText: UserTranslationInterface[] = [];
 
   if (displayedText) {
     textLanguage = displayedText.language.name;
-    listOfWords = displayedText.text.split(/_\$_/g);
-    listOfLemmas = displayedText.lemmas.split(/_\$_/g);
     listOfUserTranslationsInThisText = userTranslations.filter((ut) =>
       listOfLemmas.includes(ut.translation.wordSource.word),
     );
@@ -1,3 +1,4 @@
+import { TextInterface } from "@/types/types";
 import { clsx, type ClassValue } from "clsx";
 import { twMerge } from "tailwind-merge";
 
@@ -24,3 +25,28 @@ export function shuffle(array: any) {
 
   return array;
 }
+
+export function getWordsAndLemmas(text: TextInterface) {
+  // Texts being generated have no tokens yet.
+  if (!text.tokens) {
+    return { words: [text.text], lemmas: [""], sentences: [0] };
+  }
+
+  const { offsets, lemmas, lemmaIds, sentences } = text.tokens;
+
+  // Offsets count code points, like Python strings, while String.slice
+  // counts UTF-16 code units, which differ after an emoji.
+  const chars = Array.from(text.text);
+
+  const words = offsets.map((start, i) =>
+    chars
+      .slice(start, i + 1 < offsets.length ? offsets[i + 1] : undefined)
+      .join(""),
+  );
+
+  return {
+    words,
+    lemmas: lemmaIds.map((id) => lemmas[id]),
+    sentences,
+  };
+}
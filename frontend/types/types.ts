@@ -1,7 +1,15 @@
+export interface TokensInterface {
+  // In code points, not UTF-16 code units.
+  offsets: number[];
+  lemmas: string[];
+  lemmaIds: number[];
+  sentences: number[];
+}
+
 export interface TextInterface {
   id: string;
   text: string;
-  lemmas: string;
+  tokens: TokensInterface | null;
   language: LanguageInterface;
   subject: string;
   hasFinishedGeneration: boolean;